@@ -1,8 +1,14 @@
 import os
 import sys
-import json
+import hashlib
+import orjson
 import io
+import logging
+import shutil
+import tempfile
+import pandas as pd
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 
 
@@ -13,25 +19,74 @@ load_dotenv(os.path.join(APP_DIR, ".env"))
 if APP_DIR not in sys.path:
 	sys.path.insert(0, APP_DIR)
 
-from tax_validators.data_extractor import (
-	extract_text_from_pdf,
-	extract_tables_from_pdf,
-	get_page_count,
-	extract_key_fields,
-)
-from tax_validators.gemini_validator import (
-	initialize_gemini,
-	extract_structured_data_t1,
-	extract_structured_data_noa,
-	validate_cross_document,
-	validate_accountant_info,
-)
-from tax_validators.image_analyzer import (
-	analyze_image_quality,
-)
+# Library modules only create loggers; output is configured once, here
+logging.basicConfig(level=logging.INFO)
+
+# Project modules (PDF parsing, OpenCV, Gemini, forensics) are imported inside
+# the handlers that use them so the UI renders without paying for them upfront
 
 st.set_page_config(page_title="LendGuard", layout="wide")
 
+# Forensic uploads up to this size are written to RAM-backed /dev/shm (where
+# available) instead of disk; the checks need a real file path either way
+FORENSIC_SPOOL_MAX_SIZE = 32 << 20
+
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+	"""Shared worker pool for running the T1/NOA halves of each step side by side."""
+	return ThreadPoolExecutor(max_workers=4)
+
+
+def to_json(obj: Any) -> bytes:
+	"""Serialize results with orjson; numpy values are supported and anything else falls back to str."""
+	return orjson.dumps(
+		obj,
+		option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+		default=str,
+	)
+
+
+def show_json(obj: Any) -> None:
+	"""Render a dict as a highlighted JSON block (cheaper than st.json on large results)."""
+	st.code(to_json(obj).decode(), language="json")
+
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def cached_forensics(doc_hash: str, file_name: str, doc_type: str, _pdf_path: str, _pdf_bytes) -> Dict[str, Any]:
+	"""
+	Cached analyze_document_forensics keyed on the document content, name and type (path/bytes are not hashed).
+	The NOA ID check is left out: it records IDs in the database, so a cached result would hide a re-upload.
+	"""
+	from forensics import analyze_document_forensics
+	return analyze_document_forensics(_pdf_path, _pdf_bytes, file_name, doc_type, doc_hash, include_noa_id=False)
+
+
+def forensics_with_noa_id(uploaded_file, doc_hash: str, doc_type: str, pdf_path: str, pdf_bytes) -> Dict[str, Any]:
+	"""
+	Cached forensic results plus a NOA ID check that runs once per upload.
+	The ID result is kept in this session for the upload's file_id, so widget reruns do not flag the
+	document as a duplicate of itself, while every new upload (by any user) is checked against the database.
+	"""
+	from forensics.forensic_analyzer import run_noa_id_check, score_results
+	results = dict(cached_forensics(doc_hash, uploaded_file.name, doc_type, pdf_path, pdf_bytes))
+	
+	noa_id_key = f"noa_id_check:{uploaded_file.file_id}:{doc_type}"
+	if noa_id_key not in st.session_state:
+		st.session_state[noa_id_key] = run_noa_id_check(pdf_path, uploaded_file.name, doc_type, doc_hash=doc_hash)
+	results['noa_id_check'] = st.session_state[noa_id_key]
+	return score_results(results)
+
+
+@st.cache_data(show_spinner="Rendering annotations...")
+def show_forensic_visualizations(doc_hash: str, overlay_hash: str, _pdf_path: str, _pdf_bytes, _results: Dict[str, Any]) -> None:
+	"""Cached create_forensic_visualizations keyed on the document and the flagged fonts/alignment it overlays."""
+	from forensics import create_forensic_visualizations
+	create_forensic_visualizations(
+		_pdf_path, _pdf_bytes, _results, max_pages=2,
+		page_images=_results.get('_page_images')
+	)
+
 st.title("🔍 LendGuard")
 st.markdown("Upload T1 Income Tax Return and Notice of Assessment for validation")
 
@@ -58,16 +113,29 @@ progress = st.empty()
 status = st.empty()
 
 if st.button("🚀 Analyze Documents", type="primary", disabled=not (t1_file and noa_file)):
+	from tax_validators.gemini_validator import initialize_gemini
+	from tax_validators._cache import (
+		cached_read_pdf,
+		cached_analyze_image_quality,
+		cached_validate_all,
+	)
+
 	with st.spinner("Analyzing documents..."):
 		analysis_ok = True
 		results: Dict[str, Any] = {}
+		# Read each upload once; the bytes double as the cache key for every step
+		t1_bytes = t1_file.getvalue()
+		noa_bytes = noa_file.getvalue()
 		try:
 			# Step 1: Extract text
 			status.info("Step 1: Extracting text from PDFs...")
 			progress.progress(10)
+			executor = get_executor()
 			try:
-				t1_text = extract_text_from_pdf(t1_file)
-				noa_text = extract_text_from_pdf(noa_file)
+				# One parse per document yields both its text and page count
+				t1_future = executor.submit(cached_read_pdf, t1_bytes)
+				noa_future = executor.submit(cached_read_pdf, noa_bytes)
+				(t1_text, _), (noa_text, noa_pages) = t1_future.result(), noa_future.result()
 			except Exception as e:
 				st.error(f"Failed to extract text: {e}")
 				analysis_ok = False
@@ -83,68 +151,36 @@ if st.button("🚀 Analyze Documents", type="primary", disabled=not (t1_file and
 				analysis_ok = False
 				raise
 
-			# Step 3: Extract structured data
-			status.info("Step 3: Extracting structured data...")
+			# Step 3: Extract structured data and validate in one AI request
+			status.info("Step 3: Extracting and validating data...")
 			progress.progress(45)
 			try:
-				t1_data = extract_structured_data_t1(t1_text, model)
-				noa_data = extract_structured_data_noa(noa_text, model)
+				validated = cached_validate_all(t1_text, noa_text, model)
+				t1_data = validated["t1_data"]
+				noa_data = validated["noa_data"]
+				validation_results = validated["validation_results"]
+				accountant_results = validated["accountant_results"]
 			except Exception as e:
-				st.error(f"Structured data extraction failed: {e}")
+				st.error(f"Structured data extraction and validation failed: {e}")
 				analysis_ok = False
 				raise
 
-			# Step 4: Cross-document validation
-			status.info("Step 4: Validating consistency...")
-			progress.progress(65)
-			try:
-				validation_results = validate_cross_document(t1_data, noa_data, model)
-			except Exception as e:
-				st.error(f"Validation failed: {e}")
-				analysis_ok = False
-				raise
-
-			# Step 5: Accountant validation
-			status.info("Step 5: Validating accountant information...")
-			progress.progress(75)
-			try:
-				if t1_data.get('accountant_name'):
-					accountant_results = validate_accountant_info(
-						t1_data.get('accountant_name'),
-						t1_data.get('accountant_phone'),
-						model
-					)
-				else:
-					accountant_results = {"flags": ["No accountant information found - FLAGGED"]}
-			except Exception as e:
-				st.warning(f"Accountant validation issue: {e}")
-				accountant_results = {"flags": [f"Validation error: {e}"]}
-
-			# Step 6: Image quality check
-			status.info("Step 6: Analyzing image quality...")
+			# Step 4: Image quality check
+			status.info("Step 4: Analyzing image quality...")
 			progress.progress(85)
 			try:
-				# Reset and read bytes for both files
-				t1_file.seek(0)
-				noa_file.seek(0)
-				t1_bytes = t1_file.read()
-				noa_bytes = noa_file.read()
-				t1_quality = analyze_image_quality(t1_bytes)
-				noa_quality = analyze_image_quality(noa_bytes)
+				t1_future = executor.submit(cached_analyze_image_quality, t1_bytes)
+				noa_future = executor.submit(cached_analyze_image_quality, noa_bytes)
+				t1_quality, noa_quality = t1_future.result(), noa_future.result()
 			except Exception as e:
 				st.warning(f"Image quality analysis issue: {e}")
 				t1_quality, noa_quality = {"quality_flags": [str(e)], "blurry_pages": [], "avg_blur_score": 0}, {"quality_flags": [str(e)], "blurry_pages": [], "avg_blur_score": 0}
 
-			# Step 7: Page count check
-			status.info("Step 7: Checking page count...")
+			# Step 5: Page count check
+			status.info("Step 5: Checking page count...")
 			progress.progress(92)
-			try:
-				noa_file.seek(0)
-				noa_pages = get_page_count(noa_file)
-				page_check = {"status": "pass" if noa_pages > 2 else "fail", "count": noa_pages}
-			except Exception as e:
-				st.warning(f"Page count check failed: {e}")
-				page_check = {"status": "fail", "count": 0}
+			# Page count was read during text extraction in Step 1
+			page_check = {"status": "pass" if noa_pages > 2 else "fail", "count": noa_pages}
 
 			# Aggregate results
 			results = {
@@ -197,26 +233,24 @@ if st.button("🚀 Analyze Documents", type="primary", disabled=not (t1_file and
 				col1, col2 = st.columns(2)
 				with col1:
 					st.subheader("T1 Data")
-					st.json(results["t1_data"]) 
+					show_json(results["t1_data"])
 				with col2:
 					st.subheader("NOA Data")
-					st.json(results["noa_data"]) 
-
+					show_json(results["noa_data"])
 			with tab3:
 				col1, col2 = st.columns(2)
 				with col1:
 					st.subheader("T1 Quality")
-					st.json(results["t1_quality"])
+					show_json(results["t1_quality"])
 				with col2:
 					st.subheader("NOA Quality")
-					st.json(results["noa_quality"])
-
+					show_json(results["noa_quality"])
 			with tab4:
 				st.subheader("Raw Results")
-				st.json(results)
+				show_json(results)
 				st.download_button(
 					label="⬇️ Download Results (JSON)",
-					data=json.dumps(results, indent=2),
+					data=to_json(results),
 					file_name="fraud_detection_results.json",
 					mime="application/json",
 				)
@@ -241,6 +275,10 @@ forensic_file = st.file_uploader(
 )
 
 if forensic_file:
+	from forensics.checks import IMAGE_BLUR_THRESHOLD, content_hash
+	from forensics.forensic_analyzer import preprocess_uploaded_file
+	from forensics.database import get_database
+
 	st.info(f"📄 Analyzing: {forensic_file.name}")
 	
 	# Document type selector
@@ -261,11 +299,6 @@ if forensic_file:
 	doc_type_simple = doc_type_map[doc_type]
 	
 	# Save uploaded file temporarily
-	import tempfile
-	import os
-	from forensics import analyze_document_forensics, create_forensic_visualizations
-	from forensics.forensic_analyzer import preprocess_uploaded_file
-	
 	# Check if file is an image and convert if needed
 	file_name_lower = forensic_file.name.lower()
 	is_image = file_name_lower.endswith(('.jpg', '.jpeg', '.png'))
@@ -278,17 +311,30 @@ if forensic_file:
 			st.error(f"Error converting image: {str(e)}")
 			st.stop()
 	else:
-		pdf_bytes = forensic_file.getvalue()
+		# PDFs are streamed straight to disk; the checks read them from tmp_path
+		pdf_bytes = None
 		temp_img_path = None
 	
-	with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-		tmp_file.write(pdf_bytes)
+	spool_dir = None
+	if forensic_file.size <= FORENSIC_SPOOL_MAX_SIZE and os.path.isdir('/dev/shm'):
+		spool_dir = '/dev/shm'
+	
+	with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=spool_dir) as tmp_file:
+		if pdf_bytes is None:
+			forensic_file.seek(0)
+			shutil.copyfileobj(forensic_file, tmp_file, 1 << 20)
+		else:
+			tmp_file.write(pdf_bytes)
 		tmp_path = tmp_file.name
 	
 	try:
 		with st.spinner("Running forensic analysis..."):
 			# Run analysis with new parameters
-			results = analyze_document_forensics(tmp_path, pdf_bytes, forensic_file.name, doc_type_simple)
+			# Reruns on the same document (any widget interaction) reuse the
+			# previous results instead of re-running every check. Images are
+			# identified by the uploaded bytes, not by the converted PDF
+			doc_hash = content_hash(forensic_file.getvalue() if is_image else tmp_path)
+			results = forensics_with_noa_id(forensic_file, doc_hash, doc_type_simple, tmp_path, pdf_bytes)
 			
 			# Display overall risk
 			risk_colors = {
@@ -339,7 +385,8 @@ if forensic_file:
 			with st.expander("📏 Text Alignment Analysis"):
 				align_data = results['alignment']
 				if align_data.get('count', 0) > 0:
-					st.warning(f"Found {align_data['count']} alignment issues")
+					more = '+' if align_data.get('capped') else ''
+					st.warning(f"Found {align_data['count']}{more} alignment issues")
 					if align_data.get('issues'):
 						st.dataframe(align_data['issues'][:10])
 				else:
@@ -357,7 +404,7 @@ if forensic_file:
 			with st.expander("📋 Metadata Analysis"):
 				meta_data = results['metadata']
 				if meta_data.get('metadata'):
-					st.json(meta_data['metadata'])
+					show_json(meta_data['metadata'])
 				if meta_data.get('flags'):
 					for flag in meta_data['flags']:
 						st.warning(f"⚠️ {flag}")
@@ -369,8 +416,8 @@ if forensic_file:
 				st.write(f"**Total decimal numbers:** {num_data.get('total_numbers', 0)}")
 				if num_data.get('precision_map'):
 					st.write("**Decimal precision distribution:**")
-					for precision, numbers in num_data['precision_map'].items():
-						st.write(f"  - {precision} decimal places: {len(numbers)} numbers")
+					for precision, bucket in num_data['precision_map'].items():
+						st.write(f"  - {precision} decimal places: {bucket['count']} numbers (e.g. {', '.join(bucket['samples'])})")
 				if num_data.get('flags'):
 					for flag in num_data['flags']:
 						st.warning(f"⚠️ {flag}")
@@ -381,7 +428,7 @@ if forensic_file:
 				img_data = results['image']
 				if img_data.get('avg_blur'):
 					st.write(f"**Average blur score:** {img_data['avg_blur']:.1f}")
-					st.caption("(Higher = Sharper, <100 = Potentially Blurry)")
+					st.caption(f"(Higher = Sharper, <{IMAGE_BLUR_THRESHOLD} = Potentially Blurry)")
 				if img_data.get('flags'):
 					for flag in img_data['flags']:
 						st.warning(f"⚠️ {flag}")
@@ -402,7 +449,6 @@ if forensic_file:
 						
 						if page_data.get('page_numbers_found'):
 							st.write("**Extracted page numbers:**")
-							import pandas as pd
 							st.dataframe(pd.DataFrame(page_data['page_numbers_found']))
 					else:
 						st.success("✅ Page numbering is consistent")
@@ -421,8 +467,7 @@ if forensic_file:
 						st.warning("This identification number has been used before:")
 						
 						dup_details = id_data.get('duplicate_details', {})
-						st.json(dup_details)
-						
+						show_json(dup_details)
 						for flag in id_data.get('flags', []):
 							st.error(flag)
 					else:
@@ -431,28 +476,31 @@ if forensic_file:
 						
 						if id_data.get('extracted_info'):
 							st.write("**Extracted Information:**")
-							st.json(id_data['extracted_info'])
-						
+							show_json(id_data['extracted_info'])
 						for flag in id_data.get('flags', []):
 							st.info(flag)
 			
 			# Visual annotations
 			st.markdown("---")
-			create_forensic_visualizations(tmp_path, pdf_bytes, results, max_pages=2)
+			with st.expander("📍 Annotated page visualizations"):
+				if st.button("Render annotations", key="viz"):
+					overlay_hash = hashlib.blake2b(
+						to_json({'fonts': results['fonts'], 'alignment': results['alignment']}),
+						digest_size=16
+					).hexdigest()
+					show_forensic_visualizations(
+						doc_hash, overlay_hash, tmp_path, pdf_bytes, results
+					)
 			
 			# Database Management Section
 			st.markdown("---")
 			st.subheader("🗄️ Forensic Database")
 			
 			with st.expander("View Recorded NOA IDs"):
-				from forensics.database import ForensicDatabase
-				
-				db = ForensicDatabase()
+				db = get_database()
 				records = db.get_all_records()
 				
 				if records:
-					import pandas as pd
-					
 					df = pd.DataFrame(records, columns=[
 						'ID', 'ID Number', 'SIN Last 4', 'Name', 'Date Issued',
 						'Upload Time', 'Doc Hash', 'File Name', 'Notes', 'Created At'
@@ -464,15 +512,16 @@ if forensic_file:
 					st.info("No records in database yet")
 			
 			with st.expander("View Duplicate Detection History"):
-				from forensics.database import ForensicDatabase
-				
-				db = ForensicDatabase()
+				db = get_database()
 				duplicates = db.get_duplicate_history()
 				
 				if duplicates:
 					st.warning(f"⚠️ {len(duplicates)} duplicate detections recorded")
 					for dup in duplicates:
-						st.error(f"ID: {dup[1]} | File: {dup[3]} | Detected: {dup[4]}")
+						st.error(
+							f"ID: {dup['identification_number']} | File: {dup['duplicate_file_name']} "
+							f"| Detected: {dup['detected_timestamp']}"
+						)
 				else:
 					st.success("No duplicates detected yet")
 			
@@ -2,7 +2,9 @@ import os
 import sys
 import logging
 import traceback
-from typing import Dict, Any
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import Pool, Queue
+from typing import Dict, Any, Tuple
 
 # Add project root to Python path
 project_root = os.path.dirname(os.path.abspath(__file__))
@@ -10,10 +12,8 @@ sys.path.insert(0, project_root)
 
 # Import project modules
 from tax_validators.data_extractor import (
-    extract_text_from_pdf, 
-    extract_key_fields, 
-    extract_tables_from_pdf, 
-    get_page_count
+    extract_text_and_page_count, 
+    extract_key_fields
 )
 from tax_validators.gemini_validator import (
     initialize_gemini,
@@ -21,15 +21,26 @@ from tax_validators.gemini_validator import (
     extract_structured_data_noa
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(os.path.join(project_root, 'debug.log'))
-    ]
-)
+# Configure logging: every process (main and pool workers) only enqueues log
+# records; a single QueueListener thread in the main process does the writes
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_FILE = os.path.join(project_root, 'debug.log')
+
+def _build_log_handlers():
+    """Console and file handlers drained by the QueueListener"""
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(), logging.FileHandler(LOG_FILE)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+def _route_logging_to(log_queue) -> None:
+    """Replace this process's root handlers with a QueueHandler (also the Pool initializer)"""
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(logging.INFO)
+    logger.setLevel(logging.DEBUG)
+
 logger = logging.getLogger(__name__)
 
 def debug_pdf_extraction(pdf_path: str, doc_type: str) -> Dict[str, Any]:
@@ -51,21 +62,20 @@ def debug_pdf_extraction(pdf_path: str, doc_type: str) -> Dict[str, Any]:
     }
     
     try:
-        # Step 1: Get Page Count
+        # Steps 1-2: Page count and full text from one open of the PDF
         logger.info(f"Analyzing PDF: {pdf_path}")
-        page_count = get_page_count(pdf_path)
+        full_text, page_count = extract_text_and_page_count(pdf_path)
         debug_info['page_count'] = page_count
-        logger.debug(f"Total pages: {page_count}")
+        logger.debug("Total pages: %d", page_count)
         
-        # Step 2: Extract Full Text
-        full_text = extract_text_from_pdf(pdf_path)
         debug_info['full_text'] = full_text
-        logger.debug(f"Extracted text length: {len(full_text)} characters")
+        logger.debug("Extracted text length: %d characters", len(full_text))
         
         # Step 3: Extract Tables
+        # from tax_validators.data_extractor import extract_tables_from_pdf
         # tables = extract_tables_from_pdf(pdf_path)
         # debug_info['tables'] = tables
-        # logger.debug(f"Extracted {len(tables)} tables")
+        # logger.debug("Extracted %d tables", len(tables))
         
         # # Step 4: Extract Key Fields
         # extracted_fields = extract_key_fields(full_text, doc_type)
@@ -82,11 +92,11 @@ def debug_pdf_extraction(pdf_path: str, doc_type: str) -> Dict[str, Any]:
             if doc_type == 'NOA':
                 model = initialize_gemini()
                 noa_data = extract_structured_data_noa(full_text, model)
-                logger.info(f"Structured Data (NOA): {noa_data}")
+                logger.info("Structured Data (NOA): %s", noa_data)
             if doc_type == 'T1':
                 model = initialize_gemini()
                 t1_data = extract_structured_data_t1(full_text, model)
-                logger.info(f"Structured Data (T1): {t1_data}")
+                logger.info("Structured Data (T1): %s", t1_data)
         except Exception as e:
             logger.error(f"Structured data extraction failed: {e}")
             analysis_ok = False
@@ -105,10 +115,37 @@ def debug_pdf_extraction(pdf_path: str, doc_type: str) -> Dict[str, Any]:
         logger.error(f"Extraction Error: {error_details}")
         return debug_info
 
+def _debug_one(task: Tuple[str, str]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Pool worker: debug a single (pdf_path, doc_type) pair
+
+    Defined at module level so it can be pickled. Gemini is initialized
+    inside debug_pdf_extraction, i.e. in the worker process, never before fork.
+    """
+    pdf_path, doc_type = task
+    logger.info(f"Starting debug for {pdf_path}")
+    return pdf_path, debug_pdf_extraction(pdf_path, doc_type)
+
 def main():
     """
     Main debugging entry point
     """
+    log_queue = Queue()
+    listener = QueueListener(log_queue, *_build_log_handlers(), respect_handler_level=True)
+    _route_logging_to(log_queue)
+    listener.start()
+    try:
+        _run_debug(log_queue)
+    finally:
+        listener.stop()
+
+def _run_debug(log_queue) -> None:
+    """
+    Debug every sample PDF and log a summary
+    
+    Args:
+        log_queue: Queue the pool workers send their log records to
+    """
     # Sample documents directory
     sample_dir = os.path.join(project_root, 'sample_documents')
     
@@ -118,20 +155,23 @@ def main():
     # Collect debug results
     all_debug_results = {}
     
-    # Debug each document type
-    for doc_type in doc_types:
-        # Find PDF files for this document type
-        pdf_files = [
-            os.path.join(sample_dir, f) 
-            for f in os.listdir(sample_dir) 
-            if f.lower().endswith('.pdf') and f.startswith(doc_type)
-        ]
-        
-        # Debug each PDF
-        for pdf_path in pdf_files:
-            logger.info(f"Starting debug for {pdf_path}")
-            debug_result = debug_pdf_extraction(pdf_path, doc_type)
-            all_debug_results[pdf_path] = debug_result
+    # Find PDF files for each document type
+    tasks = [
+        (os.path.join(sample_dir, f), doc_type)
+        for doc_type in doc_types
+        for f in os.listdir(sample_dir)
+        if f.lower().endswith('.pdf') and f.startswith(doc_type)
+    ]
+    
+    # Debug the PDFs in parallel, one file per worker process
+    if tasks:
+        with Pool(
+            min(os.cpu_count() or 1, 8, len(tasks)),
+            initializer=_route_logging_to,
+            initargs=(log_queue,)
+        ) as pool:
+            for pdf_path, debug_result in pool.imap_unordered(_debug_one, tasks):
+                all_debug_results[pdf_path] = debug_result
     
     # Final summary
     logger.info("Debugging Complete")
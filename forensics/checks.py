@@ -1,12 +1,23 @@
-import pdfplumber
-import PyPDF2
+import ctypes
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
 import cv2
 import numpy as np
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_bytes, convert_from_path
 from PIL import Image
 from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pdfplumber.utils import extract_text as _chars_to_text, extract_words as _chars_to_words
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+import hashlib
+import os
+import mmap
 import re
-import io
+import tempfile
+
+from utils.pdfium_lock import PDFIUM_LOCK
 
 # Check if pytesseract is available
 try:
@@ -25,47 +36,388 @@ try:
 except:
     TESSERACT_AVAILABLE = False
 
-def check_text_alignment(pdf_path):
+
+# Patterns used by the checks below, compiled once at import time
+_DECIMAL_RE = re.compile(r'\d+\.\d+')
+_PAGE_LABEL_RE = re.compile(r'Page\s*(\d+)', re.IGNORECASE)
+_NOA_ID_CANDIDATE_RE = re.compile(r'\b([A-Z0-9]{8,10})\b', re.IGNORECASE)
+_NOA_ID_SHAPE_RE = re.compile(r'[A-Z0-9]*[XY][0-9][A-Z]{2}')
+_NOA_SIN_RE = re.compile(r'XXX XX(\d) (\d{3})')
+_NOA_NAME_RE = re.compile(r'([A-Z\s]+)\n\d+\s+[A-Z]')
+_NOA_DATE_ISSUED_RE = re.compile(r'Date issued\s+([A-Za-z]+\s+\d+,\s+\d{4})')
+
+# Consumer editing tools flagged when they appear in the PDF producer/creator
+SUSPICIOUS_TOOLS = [
+    'Word', 'LibreOffice', 'Google Docs',
+    'Smallpdf', 'iLovePDF', 'CorelDRAW',
+    'Photoshop', 'Illustrator', 'Canva', 'Inkscape'
+]
+_SUSPICIOUS_TOOLS_RE = re.compile('|'.join(re.escape(tool) for tool in SUSPICIOUS_TOOLS), re.IGNORECASE)
+
+
+@dataclass
+class DocumentContext:
+    """
+    One PDF shared by all forensic checks of a document
+    The pdfium document is opened on first use and kept open, and full-page
+    rasters are cached per (dpi, grayscale), so the checks no longer re-open
+    or re-render the file each. Every helper and check below that takes a
+    PDF path or bytes also accepts a DocumentContext.
+    
+    Args:
+        source: PDF file path, or bytes-like object
+    """
+    source: object
+    _pdf: object = field(default=None, repr=False)
+    _page_count: int = field(default=None, repr=False)
+    _rasters: dict = field(default_factory=dict, repr=False)
+    
+    @property
+    def pdf(self):
+        """The shared pdfium document (use it inside _open_pdfium, which holds PDFIUM_LOCK)"""
+        with PDFIUM_LOCK:
+            if self._pdf is None:
+                self._pdf = pdfium.PdfDocument(self.source)
+            return self._pdf
+    
+    @property
+    def page_count(self):
+        """Number of pages (read once from pdfium)"""
+        if self._page_count is None:
+            with PDFIUM_LOCK:
+                self._page_count = len(self.pdf)
+        return self._page_count
+    
+    def page_images(self, dpi, last_page, grayscale=True):
+        """
+        Rendered pages 1..last_page (fewer if the document is shorter)
+        Pages already rendered at this dpi are reused; only missing ones
+        are rasterized. Once page_count has been read, this only calls
+        poppler, so it may run on another thread than the pdfium users
+        """
+        last_page = min(last_page, self.page_count)
+        images = self._rasters.setdefault((dpi, grayscale), [])
+        if len(images) < last_page:
+            images.extend(render_pdf_pages(
+                self.source, dpi=dpi, grayscale=grayscale,
+                first_page=len(images) + 1, last_page=last_page
+            ))
+        return images[:last_page]
+    
+    def close(self):
+        """Close the pdfium document and drop cached rasters"""
+        if self._pdf is not None:
+            with PDFIUM_LOCK:
+                self._pdf.close()
+            self._pdf = None
+        self._rasters.clear()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def _open_pdfium(pdf_source):
+    """
+    Yield a pdfium document for a path, bytes or DocumentContext
+    A context's shared document stays open; others are closed on exit.
+    PDFIUM_LOCK is held until the block exits
+    """
+    with PDFIUM_LOCK:
+        if isinstance(pdf_source, DocumentContext):
+            yield pdf_source.pdf
+            return
+        
+        pdf = pdfium.PdfDocument(pdf_source)
+        try:
+            yield pdf
+        finally:
+            pdf.close()
+
+
+def render_pdf_pages(pdf_source, **kwargs):
+    """
+    Rasterize PDF pages from a file path or in-memory bytes
+    
+    Paths are handed to poppler directly; convert_from_bytes would first
+    copy the whole buffer into another temp file.
+    
+    Args:
+        pdf_source: PDF file path, bytes-like object or DocumentContext
+        **kwargs: Passed through to pdf2image (dpi, first_page, ...)
+    
+    Returns:
+        List of PIL Image objects
+    """
+    if isinstance(pdf_source, DocumentContext):
+        pdf_source = pdf_source.source
+    if isinstance(pdf_source, str):
+        return convert_from_path(pdf_source, **kwargs)
+    return convert_from_bytes(pdf_source, **kwargs)
+
+
+def render_page_region(pdf_source, page_index, box, dpi):
+    """
+    Rasterize one region of one page with pdfium
+    Only the requested area is rendered, so OCR crops do not pay for the
+    whole page (let alone the whole document)
+    
+    Args:
+        pdf_source: PDF file path, bytes-like object or DocumentContext
+        page_index: 0-based page index
+        box: (left, top, right, bottom) as fractions of the page size
+        dpi: Output resolution
+    
+    Returns:
+        PIL Image of the region
+    """
+    with _open_pdfium(pdf_source) as pdf:
+        page = pdf[page_index]
+        try:
+            width, height = page.get_size()
+            left, top, right, bottom = box
+            bitmap = page.render(
+                scale=dpi / 72,
+                crop=(left * width, (1 - bottom) * height, (1 - right) * width, top * height)
+            )
+            return bitmap.to_pil()
+        finally:
+            page.close()
+
+
+def count_pdf_pages(pdf_source):
+    """Page count of a PDF file path, bytes-like object or DocumentContext"""
+    if isinstance(pdf_source, DocumentContext):
+        return pdf_source.page_count
+    with _open_pdfium(pdf_source) as pdf:
+        return len(pdf)
+
+
+def content_hash(pdf_source):
+    """
+    SHA-256 hex digest of a PDF given as a path or bytes-like object
+    Paths are memory-mapped rather than read into a Python bytes object.
+    SHA-256 is kept over blake2b: OpenSSL's SHA-NI path is the faster of the
+    two on current x86 CPUs, and stored document hashes stay comparable.
+    """
+    if isinstance(pdf_source, DocumentContext):
+        pdf_source = pdf_source.source
+    if isinstance(pdf_source, str):
+        with open(pdf_source, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+    return hashlib.sha256(pdf_source).hexdigest()
+
+
+# Documents with at least this many pages are parsed page-by-page in a
+# process pool
+PARALLEL_PARSE_MIN_PAGES = 16
+PARALLEL_PARSE_MAX_WORKERS = 4
+
+# pdfium text-page codes that are not real glyphs (line breaks, hyphen
+# markers, unknown); pdfplumber has no char for them either
+_PDFIUM_SKIP_CODES = {0x0, 0x2, 0xA, 0xD, 0xFFFE, 0xFFFF}
+
+
+def _pdfium_page_chars(page, doctop):
+    """
+    Read a page's glyphs with pdfium as pdfplumber-style char dicts
+    Uses loose (font-metric) boxes, which line up with pdfplumber's char
+    boxes, so pdfplumber's word/text grouping can run on them unchanged
+    """
+    textpage = page.get_textpage()
+    height = page.get_height()
+    font_buf = ctypes.create_string_buffer(256)
+    flags = ctypes.c_int()
+    chars = []
+    
+    try:
+        for i in range(textpage.count_chars()):
+            code = pdfium_c.FPDFText_GetUnicode(textpage, i)
+            if code in _PDFIUM_SKIP_CODES or pdfium_c.FPDFText_IsGenerated(textpage, i) == 1:
+                continue
+            
+            x0, y0, x1, y1 = textpage.get_charbox(i, loose=True)
+            pdfium_c.FPDFText_GetFontInfo(textpage, i, font_buf, len(font_buf), ctypes.byref(flags))
+            chars.append({
+                'text': chr(code),
+                'fontname': font_buf.value.decode('utf-8', 'replace') or 'Unknown',
+                'size': pdfium_c.FPDFText_GetFontSize(textpage, i),
+                'x0': x0,
+                'x1': x1,
+                'top': height - y1,
+                'bottom': height - y0,
+                'doctop': doctop + height - y1,
+                'upright': abs(pdfium_c.FPDFText_GetCharAngle(textpage, i)) < 1e-3
+            })
+    finally:
+        textpage.close()
+    
+    return chars
+
+
+def _page_entry(page_num, page, doctop):
+    """Collect one page's data for extract_page_data"""
+    chars = _pdfium_page_chars(page, doctop)
+    return {
+        'page_num': page_num,
+        'words': _chars_to_words(chars),
+        'font_counts': Counter(char['fontname'] for char in chars),
+        'text': _chars_to_text(chars)
+    }
+
+
+def _parse_page(pdf_path, page_index):
+    """
+    Process-pool worker: open the PDF and parse a single page
+    Workers are single-threaded processes, so they open pdfium directly
+    instead of taking PDFIUM_LOCK (a forked copy may already be held)
+    """
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        doctop = sum(pdf.get_page_size(i)[1] for i in range(page_index))
+        page = pdf[page_index]
+        try:
+            return _page_entry(page_index + 1, page, doctop)
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+
+
+def _page_text(pdf_source, page_index):
+    """Text of a single page, read the same way as extract_page_data()"""
+    with _open_pdfium(pdf_source) as pdf:
+        page = pdf[page_index]
+        try:
+            return _chars_to_text(_pdfium_page_chars(page, 0))
+        finally:
+            page.close()
+
+
+def extract_page_data(pdf_path):
+    """
+    Parse every page once and collect what the text-based checks need
+    Glyphs come from pdfium (C) instead of pdfminer; words and text are then
+    grouped with pdfplumber's own utilities, so the output keeps pdfplumber's
+    shape and coordinates. Long files on disk are split across a process
+    pool, one page per task
+    Returns: [
+        {'page_num': int, 'words': list, 'font_counts': Counter, 'text': str},
+        ...
+    ]
+    """
+    workers = min(os.cpu_count() or 1, PARALLEL_PARSE_MAX_WORKERS)
+    file_path = pdf_path.source if isinstance(pdf_path, DocumentContext) else pdf_path
+    
+    with _open_pdfium(pdf_path) as pdf:
+        num_pages = len(pdf)
+        if not isinstance(file_path, str) or workers < 2 or num_pages < PARALLEL_PARSE_MIN_PAGES:
+            pages = []
+            doctop = 0
+            for page_index in range(num_pages):
+                page = pdf[page_index]
+                try:
+                    pages.append(_page_entry(page_index + 1, page, doctop))
+                    doctop += page.get_height()
+                finally:
+                    page.close()
+            return pages
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_parse_page, repeat(file_path), range(num_pages)))
+
+
+def run_text_checks(pdf_path, pages=None):
+    """
+    Run the alignment, font and number checks over a single parse
+    Each check fails independently, like the individual check_* calls
+    Returns: {
+        'alignment': dict, 'fonts': dict, 'numbers': dict,
+        'pages': list from extract_page_data(), or None if parsing failed
+    }
+    """
+    if pages is None:
+        try:
+            pages = extract_page_data(pdf_path)
+        except Exception:
+            # Each check below re-raises its own parse error
+            pages = None
+    
+    results = {'pages': pages}
+    for key, check in (
+        ('alignment', check_text_alignment),
+        ('fonts', check_font_consistency),
+        ('numbers', check_number_patterns)
+    ):
+        try:
+            results[key] = check(pdf_path, pages)
+        except Exception as e:
+            results[key] = {'risk_score': 0, 'error': str(e)}
+    
+    return results
+
+
+# The alignment score saturates above 10 issues, so scanning stops once this
+# many are found (the app only lists the first 10 anyway)
+MAX_ALIGNMENT_ISSUES = 11
+
+
+def check_text_alignment(pdf_path, pages=None):
     """
     Detect misaligned text rows
+    Pass pages from extract_page_data() to skip re-parsing the PDF
+    Stops at MAX_ALIGNMENT_ISSUES issues; 'capped' is True when it did
     Returns: {
         'risk_score': 0-100,
         'issues': [list of alignment issues],
-        'count': int
+        'count': int,
+        'capped': bool
     }
     """
     alignment_issues = []
     
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, 1):
-            words = page.extract_words()
-            if not words:
-                continue
-            
-            # Group words by y-coordinate (rows)
-            rows = {}
-            for word in words:
-                y_coord = round(word['top'], 1)
-                if y_coord not in rows:
-                    rows[y_coord] = []
-                rows[y_coord].append(word)
-            
-            # Check alignment within each row
-            for y, words_in_row in rows.items():
-                if len(words_in_row) < 2:
-                    continue
-                
-                tops = [w['top'] for w in words_in_row]
-                deviation = max(tops) - min(tops)
-                
-                if deviation > 1.5:  # Misalignment threshold
-                    alignment_issues.append({
-                        'page': page_num,
-                        'row_y': round(y, 1),
-                        'deviation': round(deviation, 2),
-                        'num_words': len(words_in_row),
-                        'words': words_in_row
-                    })
+    if pages is None:
+        pages = extract_page_data(pdf_path)
+    
+    for page in pages:
+        page_num = page['page_num']
+        words = page['words']
+        if not words:
+            continue
+        
+        # Group words by y-coordinate (rows): a stable sort on the rounded
+        # tops puts each row in one contiguous segment, in reading order
+        tops = np.fromiter((w['top'] for w in words), dtype=np.float64, count=len(words))
+        keys = np.round(tops, 1)
+        order = np.argsort(keys, kind='stable')
+        row_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        
+        # Per-row spread of the tops in one pass over all segments
+        sorted_tops = tops[order]
+        deviations = np.maximum.reduceat(sorted_tops, starts) - np.minimum.reduceat(sorted_tops, starts)
+        
+        # Misalignment threshold; only rows with 2+ words can be misaligned.
+        # Report rows in the order they first appear on the page
+        flagged = np.flatnonzero((counts >= 2) & (deviations > 1.5))
+        flagged = flagged[np.argsort(order[starts[flagged]], kind='stable')]
+        flagged = flagged[:MAX_ALIGNMENT_ISSUES - len(alignment_issues)]
+        
+        for row in flagged:
+            start, count = starts[row], counts[row]
+            words_in_row = [words[i] for i in order[start:start + count]]
+            alignment_issues.append({
+                'page': page_num,
+                'row_y': round(float(row_keys[row]), 1),
+                'deviation': round(float(deviations[row]), 2),
+                'num_words': int(count),
+                'words': words_in_row
+            })
+        
+        if len(alignment_issues) >= MAX_ALIGNMENT_ISSUES:
+            break
     
     # Calculate risk score
     if len(alignment_issues) > 10:
@@ -80,13 +432,15 @@ def check_text_alignment(pdf_path):
     return {
         'risk_score': risk_score,
         'issues': alignment_issues,
-        'count': len(alignment_issues)
+        'count': len(alignment_issues),
+        'capped': len(alignment_issues) >= MAX_ALIGNMENT_ISSUES
     }
 
 
-def check_font_consistency(pdf_path):
+def check_font_consistency(pdf_path, pages=None):
     """
     Analyze font usage consistency
+    Pass pages from extract_page_data() to skip re-parsing the PDF
     Returns: {
         'risk_score': 0-100,
         'total_unique_fonts': int,
@@ -94,19 +448,14 @@ def check_font_consistency(pdf_path):
         'flags': [list of issues]
     }
     """
-    all_fonts = []
+    font_counts = Counter()
     
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            chars = page.chars
-            if not chars:
-                continue
-            
-            for char in chars:
-                font_name = char.get('fontname', 'Unknown')
-                all_fonts.append(font_name)
+    if pages is None:
+        pages = extract_page_data(pdf_path)
+    
+    for page in pages:
+        font_counts.update(page['font_counts'])
     
-    font_counts = Counter(all_fonts)
     total_unique = len(font_counts)
     
     # Calculate risk
@@ -146,44 +495,45 @@ def check_metadata(pdf_path):
     metadata_info = {}
     
     try:
-        with open(pdf_path, 'rb') as f:
-            pdf = PyPDF2.PdfReader(f)
-            metadata = pdf.metadata
-            
-            if not metadata:
-                flags.append("No metadata found")
-                risk_score = 30
-                return {'risk_score': risk_score, 'flags': flags, 'metadata': {}}
-            
-            producer = str(metadata.get('/Producer', 'Unknown'))
-            creator = str(metadata.get('/Creator', 'Unknown'))
-            
-            metadata_info = {
-                'producer': producer,
-                'creator': creator,
-                'creation_date': str(metadata.get('/CreationDate', 'Unknown')),
-                'mod_date': str(metadata.get('/ModDate', 'Unknown')),
-                'pages': len(pdf.pages)
-            }
-            
-            # Check for consumer editing tools
-            suspicious_tools = [
-                'Word', 'LibreOffice', 'Google Docs', 
-                'Smallpdf', 'iLovePDF', 'CorelDRAW',
-                'Photoshop', 'Illustrator', 'Canva', 'Inkscape'
-            ]
-            
-            for tool in suspicious_tools:
-                if tool.lower() in producer.lower() or tool.lower() in creator.lower():
-                    flags.append(f"Created with consumer tool: {tool}")
-                    risk_score += 35
-            
-            # Check modification
-            creation = metadata.get('/CreationDate', '')
-            modified = metadata.get('/ModDate', '')
-            if creation and modified and creation != modified:
-                flags.append("Document modified after creation")
-                risk_score += 15
+        # pdfium reads the Info dictionary from the trailer without parsing
+        # any page content
+        with _open_pdfium(pdf_path) as pdf:
+            metadata = pdf.get_metadata_dict()
+            page_count = len(pdf)
+        
+        if not any(metadata.values()):
+            flags.append("No metadata found")
+            risk_score = 30
+            return {'risk_score': risk_score, 'flags': flags, 'metadata': {}}
+        
+        producer = metadata.get('Producer') or 'Unknown'
+        creator = metadata.get('Creator') or 'Unknown'
+        
+        metadata_info = {
+            'producer': producer,
+            'creator': creator,
+            'creation_date': metadata.get('CreationDate') or 'Unknown',
+            'mod_date': metadata.get('ModDate') or 'Unknown',
+            'pages': page_count
+        }
+        
+        # Check for consumer editing tools (one scan over both fields)
+        found_tools = {
+            match.group(0).lower()
+            for match in _SUSPICIOUS_TOOLS_RE.finditer(f"{producer}\n{creator}")
+        }
+        
+        for tool in SUSPICIOUS_TOOLS:
+            if tool.lower() in found_tools:
+                flags.append(f"Created with consumer tool: {tool}")
+                risk_score += 35
+        
+        # Check modification
+        creation = metadata.get('CreationDate', '')
+        modified = metadata.get('ModDate', '')
+        if creation and modified and creation != modified:
+            flags.append("Document modified after creation")
+            risk_score += 15
     
     except Exception as e:
         flags.append(f"Metadata read error: {str(e)}")
@@ -196,27 +546,42 @@ def check_metadata(pdf_path):
     }
 
 
-def check_number_patterns(pdf_path):
+# Example numbers kept per decimal precision in check_number_patterns
+PRECISION_SAMPLES = 5
+
+
+def check_number_patterns(pdf_path, pages=None):
     """
     Analyze number formatting consistency
+    Pass pages from extract_page_data() to skip re-parsing the PDF
     Returns: {
         'risk_score': 0-100,
-        'precision_map': dict,
+        'precision_map': {precision: {'count': int, 'samples': [up to PRECISION_SAMPLES numbers]}},
         'flags': [list of issues],
         'total_numbers': int
     }
     """
-    with pdfplumber.open(pdf_path) as pdf:
-        full_text = '\n'.join([page.extract_text() for page in pdf.pages if page.extract_text()])
+    if pages is None:
+        pages = extract_page_data(pdf_path)
     
-    decimals = re.findall(r'\d+\.\d+', full_text)
+    # Count decimals per precision; only a few sample strings are kept
+    precision_counts = Counter()
+    precision_samples = {}
+    for page in pages:
+        if not page['text']:
+            continue
+        for match in _DECIMAL_RE.finditer(page['text']):
+            num = match.group()
+            precision = len(num) - num.rfind('.') - 1
+            precision_counts[precision] += 1
+            samples = precision_samples.setdefault(precision, [])
+            if len(samples) < PRECISION_SAMPLES:
+                samples.append(num)
     
-    precision_map = {}
-    for num in decimals:
-        precision = len(num.split('.')[-1])
-        if precision not in precision_map:
-            precision_map[precision] = []
-        precision_map[precision].append(num)
+    precision_map = {
+        precision: {'count': count, 'samples': precision_samples[precision]}
+        for precision, count in precision_counts.items()
+    }
     
     flags = []
     if len(precision_map) > 3:
@@ -232,14 +597,40 @@ def check_number_patterns(pdf_path):
         'risk_score': risk_score,
         'precision_map': precision_map,
         'flags': flags,
-        'total_numbers': len(decimals)
+        'total_numbers': sum(precision_counts.values())
     }
 
 
-def check_image_quality(pdf_bytes, max_pages=3):
+def _laplacian_variance(gray):
+    """
+    Variance of the Laplacian of an 8-bit grayscale image (blur metric)
+    CV_16S holds the default kernel's full range for uint8 input, and
+    meanStdDev reduces it in one SIMD pass instead of a float64 copy + var()
+    """
+    laplacian = cv2.Laplacian(gray, cv2.CV_16S)
+    _, std_dev = cv2.meanStdDev(laplacian)
+    return float(std_dev[0, 0]) ** 2
+
+
+# DPI used for the blur check; the analyzer renders grayscale pages at this
+# DPI once and shares them with the visualizer
+IMAGE_CHECK_DPI = 100
+
+# Average Laplacian variance below which pages are flagged as blurry. The
+# variance grows as the DPI drops: the original 100 at 150 dpi corresponds
+# to about 380 at IMAGE_CHECK_DPI, calibrated on Gaussian-blurred renders
+# of the sample pages
+IMAGE_BLUR_THRESHOLD = 380
+
+# Percentiles whose ratio measures how inconsistent blur is across pages
+BLUR_SPREAD_PERCENTILES = (10, 90)
+
+
+def check_image_quality(pdf_bytes, max_pages=3, images=None):
     """
     Analyze image quality (blur detection)
-    Takes pdf_bytes (from uploaded file) instead of path
+    Takes pdf_bytes (from uploaded file), a file path or a DocumentContext
+    Pass images (grayscale, rendered at IMAGE_CHECK_DPI) to skip rasterizing the PDF
     Returns: {
         'risk_score': 0-100,
         'blur_scores': [list of scores],
@@ -248,28 +639,34 @@ def check_image_quality(pdf_bytes, max_pages=3):
     }
     """
     try:
-        from pdf2image import convert_from_bytes
-        
-        images = convert_from_bytes(pdf_bytes, dpi=150)
+        if images is None and isinstance(pdf_bytes, DocumentContext):
+            images = pdf_bytes.page_images(IMAGE_CHECK_DPI, max_pages)
+        elif images is None:
+            images = render_pdf_pages(
+                pdf_bytes, dpi=IMAGE_CHECK_DPI, grayscale=True, first_page=1, last_page=max_pages
+            )
         blur_scores = []
         
         for idx, img in enumerate(images[:max_pages], 1):
-            img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-            gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-            blur = cv2.Laplacian(gray, cv2.CV_64F).var()
+            gray = np.asarray(img if img.mode == 'L' else img.convert('L'))
+            blur = _laplacian_variance(gray)
             blur_scores.append(blur)
         
-        avg_blur = np.mean(blur_scores) if blur_scores else 0
+        scores = np.asarray(blur_scores)
+        avg_blur = float(scores.mean()) if scores.size else 0
         
         flags = []
         risk_score = 0
         
-        if avg_blur < 100:
+        if avg_blur < IMAGE_BLUR_THRESHOLD:
             flags.append(f"Low blur score ({avg_blur:.1f})")
             risk_score = 30
         
-        if len(blur_scores) > 1:
-            variance = max(blur_scores) / min(blur_scores) if min(blur_scores) > 0 else 1
+        if scores.size > 1:
+            # Inter-percentile ratio rather than max/min, so a single dark
+            # or blank page does not dominate
+            low, high = np.percentile(scores, BLUR_SPREAD_PERCENTILES)
+            variance = float(high / low) if low > 0 else 1
             if variance > 3:
                 flags.append(f"Inconsistent blur ({variance:.1f}x)")
                 risk_score += 25
@@ -286,17 +683,53 @@ def check_image_quality(pdf_bytes, max_pages=3):
             'risk_score': 0,
             'blur_scores': [],
             'avg_blur': 0,
+            'error': str(e),
             'flags': [f'Image analysis unavailable: {str(e)}']
         }
 
 
+# Page regions (left, top, right, bottom fractions) read by the OCR checks.
+# The page label sits in the top-right corner; the NOA ID gives best results
+# in the center-right area (40-80% width, 10-30% height)
+PAGE_LABEL_REGION = (0.8, 0.0, 1.0, 0.1)
+NOA_ID_REGION = (0.4, 0.1, 0.8, 0.3)
+
+# The label region also holds the form number line below "Page N", so it is
+# OCR'd as a text block restricted to the characters that can appear in it.
+# Both configs use the LSTM engine only (--oem 1), skipping the legacy one
+PAGE_LABEL_OCR_CONFIG = '--psm 6 --oem 1 -c tessedit_char_whitelist=Page0123456789'
+
+# The ID region is read as sparse text (PSM 11) without a whitelist: the
+# fallback strategy needs the lowercase "Date issued" label intact
+NOA_ID_OCR_CONFIG = '--psm 11 --oem 1'
+
+
+def _ocr_batch(images, config):
+    """
+    OCR several images with one tesseract process
+    The images are written as a multi-page TIFF; tesseract separates the
+    text of each page with a form feed
+    Returns: list with one text string per image
+    """
+    if not images:
+        return []
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tiff_path = os.path.join(tmp_dir, 'batch.tif')
+        images[0].save(tiff_path, format='TIFF', save_all=True, append_images=images[1:])
+        text = pytesseract.image_to_string(tiff_path, config=config)
+    
+    page_texts = text.split('\f')
+    return (page_texts + [''] * len(images))[:len(images)]
+
+
 def check_page_numbers(pdf_bytes, doc_type='unknown'):
     """
     Check if page numbers on odd pages are sequential and consistent
     Only applicable to NOA documents
     
     Args:
-        pdf_bytes: PDF file as bytes
+        pdf_bytes: PDF file as bytes, a file path or a DocumentContext
         doc_type: Document type ('noa', 't1', or 'unknown')
     
     Returns:
@@ -321,56 +754,53 @@ def check_page_numbers(pdf_bytes, doc_type='unknown'):
         }
     
     try:
-        # Convert PDF to images
-        images = convert_from_bytes(pdf_bytes, dpi=200)
+        num_pages = count_pdf_pages(pdf_bytes)
         
         page_numbers_found = []
         issues = []
         
-        # Check odd pages only (0-indexed: 0, 2, 4...)
-        for idx, img in enumerate(images):
-            page_num = idx + 1  # 1-indexed page number
+        # Check odd pages only: render just each one's top-right corner and
+        # OCR all crops in a single tesseract run
+        odd_pages = list(range(1, num_pages + 1, 2))
+        crops = [
+            render_page_region(pdf_bytes, page_num - 1, PAGE_LABEL_REGION, dpi=200)
+            for page_num in odd_pages
+        ]
+        
+        page_texts = _ocr_batch(crops, PAGE_LABEL_OCR_CONFIG)
+        
+        for page_num, text in zip(odd_pages, page_texts):
+            # Look for "Page X" pattern
+            match = _PAGE_LABEL_RE.search(text)
             
-            # Only check odd pages
-            if page_num % 2 == 1:
-                # Crop top-right corner (approx coordinates)
-                width, height = img.size
-                top_right = img.crop((width * 0.8, 0, width, height * 0.1))
-                
-                # OCR to extract text
-                text = pytesseract.image_to_string(top_right, config='--psm 6')
-                
-                # Look for "Page X" pattern
-                match = re.search(r'Page\s*(\d+)', text, re.IGNORECASE)
+            if match:
+                extracted_num = int(match.group(1))
+                page_numbers_found.append({
+                    'physical_page': page_num,
+                    'extracted_number': extracted_num,
+                    'expected': page_num
+                })
                 
-                if match:
-                    extracted_num = int(match.group(1))
-                    page_numbers_found.append({
-                        'physical_page': page_num,
-                        'extracted_number': extracted_num,
-                        'expected': page_num
-                    })
-                    
-                    # Check if matches expected
-                    if extracted_num != page_num:
-                        issues.append({
-                            'page': page_num,
-                            'expected': page_num,
-                            'found': extracted_num,
-                            'issue': f'Page number mismatch: expected {page_num}, found {extracted_num}'
-                        })
-                else:
-                    # Page number not found where expected
+                # Check if matches expected
+                if extracted_num != page_num:
                     issues.append({
                         'page': page_num,
-                        'issue': f'Page number not found on page {page_num}'
+                        'expected': page_num,
+                        'found': extracted_num,
+                        'issue': f'Page number mismatch: expected {page_num}, found {extracted_num}'
                     })
+            else:
+                # Page number not found where expected
+                issues.append({
+                    'page': page_num,
+                    'issue': f'Page number not found on page {page_num}'
+                })
         
         # Check for sequence gaps
         extracted_nums = [p['extracted_number'] for p in page_numbers_found if 'extracted_number' in p]
         if extracted_nums:
             # Should be: 1, 3, 5, 7...
-            expected_sequence = list(range(1, len(images) + 1, 2))
+            expected_sequence = list(range(1, num_pages + 1, 2))
             
             if sorted(extracted_nums) != expected_sequence[:len(extracted_nums)]:
                 issues.append({
@@ -394,7 +824,7 @@ def check_page_numbers(pdf_bytes, doc_type='unknown'):
             'applicable': True,
             'page_numbers_found': page_numbers_found,
             'issues': issues,
-            'total_pages': len(images)
+            'total_pages': num_pages
         }
         
     except Exception as e:
@@ -406,14 +836,18 @@ def check_page_numbers(pdf_bytes, doc_type='unknown'):
         }
 
 
-def extract_and_check_noa_id(pdf_bytes, file_name='unknown.pdf', doc_type='unknown'):
+def extract_and_check_noa_id(pdf_bytes, file_name='unknown.pdf', doc_type='unknown', first_page_text=None,
+                             doc_hash=None):
     """
     Extract identification number from NOA and check for duplicates
     
     Args:
-        pdf_bytes: PDF file as bytes
+        pdf_bytes: PDF file as bytes, a file path or a DocumentContext
         file_name: Original file name
         doc_type: Document type
+        first_page_text: Page 1 text from extract_page_data(); skips re-opening the PDF
+        doc_hash: content_hash() of the document if the caller already has it;
+            otherwise it is computed in a thread while the ID region renders
     
     Returns:
         dict with risk_score, id_number, is_duplicate, and details
@@ -438,31 +872,57 @@ def extract_and_check_noa_id(pdf_bytes, file_name='unknown.pdf', doc_type='unkno
         }
     
     try:
-        # Convert first page to image with higher DPI for better OCR quality
-        images = convert_from_bytes(pdf_bytes, dpi=300)
-        first_page = images[0]
+        from .database import get_database
+        db = get_database()
         
-        # Crop center-right area where the ID is located
-        # This region includes the Notice details box and the ID below "Date issued"
-        width, height = first_page.size
-        # Best results: center-right area (40-80% width, 10-30% height)
-        id_region = first_page.crop((width * 0.4, height * 0.1, width * 0.8, height * 0.3))
+        # Render only the center-right area of the first page where the ID is
+        # located, at higher DPI for better OCR quality. This region includes
+        # the Notice details box and the ID below "Date issued"
+        if doc_hash is None:
+            # hashlib releases the GIL, so hashing overlaps the render
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                hash_future = executor.submit(content_hash, pdf_bytes)
+                id_region = render_page_region(pdf_bytes, 0, NOA_ID_REGION, dpi=300)
+                doc_hash = hash_future.result()
+        else:
+            id_region = render_page_region(pdf_bytes, 0, NOA_ID_REGION, dpi=300)
+        doc_hash = doc_hash[:16]
+        
+        # A byte-identical resubmission is a duplicate without any OCR
+        hash_check = db.check_duplicate_hash(doc_hash)
+        if hash_check['is_duplicate']:
+            original = hash_check['original_record']
+            db.record_duplicate_detection(original['identification_number'], file_name)
+            
+            return {
+                'risk_score': 100,
+                'applicable': True,
+                'id_number': original['identification_number'],
+                'is_duplicate': True,
+                'duplicate_details': original,
+                'flags': [
+                    f'🚨 DUPLICATE DOCUMENT DETECTED!',
+                    f'This file is byte-identical to: {original["file_name"]}',
+                    f'Original upload date: {original["uploaded_timestamp"]}',
+                    f'This indicates DOCUMENT FORGERY - same NOA used twice'
+                ]
+            }
         
-        # OCR with PSM 11 (sparse text) for better accuracy on individual fields
-        text = pytesseract.image_to_string(id_region, config='--psm 11')
+        # OCR as sparse text for better accuracy on individual fields
+        text = pytesseract.image_to_string(id_region, config=NOA_ID_OCR_CONFIG)
         
         # Try multiple strategies to find the ID
         id_match = None
         
         # Strategy 1: Look for 8-9 character alphanumeric pattern (most common)
         # Pattern like: 5X4YR5JX or 5SX4YR5JX (OCR might add extra chars)
-        matches = re.findall(r'\b([A-Z0-9]{8,10})\b', text, re.IGNORECASE)
+        matches = _NOA_ID_CANDIDATE_RE.findall(text)
         
         # Filter matches that look like IDs (not other numbers/text)
         for match in matches:
             match_upper = match.upper()
             # Look for patterns like X4YR or X5J (typical ID patterns)
-            if re.search(r'[A-Z0-9]*[XY][0-9][A-Z]{2}', match_upper):
+            if _NOA_ID_SHAPE_RE.search(match_upper):
                 id_match = match_upper
                 break
         
@@ -470,7 +930,7 @@ def extract_and_check_noa_id(pdf_bytes, file_name='unknown.pdf', doc_type='unkno
         if not id_match and 'date issued' in text.lower():
             idx = text.lower().find('date issued')
             text_after_date = text[idx+50:]
-            pattern_match = re.search(r'\b([A-Z0-9]{8,10})\b', text_after_date, re.IGNORECASE)
+            pattern_match = _NOA_ID_CANDIDATE_RE.search(text_after_date)
             if pattern_match:
                 id_match = pattern_match.group(1).upper()
         
@@ -496,8 +956,6 @@ def extract_and_check_noa_id(pdf_bytes, file_name='unknown.pdf', doc_type='unkno
             id_number = '5' + id_number[2:]  # Remove S completely
         
         # Check for duplicates in database
-        from .database import ForensicDatabase
-        db = ForensicDatabase()
         duplicate_check = db.check_duplicate_id(id_number)
         
         if duplicate_check['is_duplicate']:
@@ -525,28 +983,25 @@ def extract_and_check_noa_id(pdf_bytes, file_name='unknown.pdf', doc_type='unkno
             full_name = None
             date_issued = None
             
-            with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-                first_page_text = pdf.pages[0].extract_text()
-                
+            if first_page_text is None:
+                first_page_text = _page_text(pdf_bytes, 0)
+            
+            if first_page_text:
                 # Extract SIN (XXX XX3 241 format)
-                sin_match = re.search(r'XXX XX(\d) (\d{3})', first_page_text)
+                sin_match = _NOA_SIN_RE.search(first_page_text)
                 if sin_match:
                     sin_last_4 = sin_match.group(1) + sin_match.group(2)
                 
                 # Extract name (line after "Notice details" or before address)
-                name_match = re.search(r'([A-Z\s]+)\n\d+\s+[A-Z]', first_page_text)
+                name_match = _NOA_NAME_RE.search(first_page_text)
                 if name_match:
                     full_name = name_match.group(1).strip()
                 
                 # Extract date issued
-                date_match = re.search(r'Date issued\s+([A-Za-z]+\s+\d+,\s+\d{4})', first_page_text)
+                date_match = _NOA_DATE_ISSUED_RE.search(first_page_text)
                 if date_match:
                     date_issued = date_match.group(1)
             
-            # Calculate document hash for integrity
-            import hashlib
-            doc_hash = hashlib.sha256(pdf_bytes).hexdigest()[:16]
-            
             # Store in database
             stored = db.store_id_number(
                 identification_number=id_number,
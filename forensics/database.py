@@ -1,22 +1,52 @@
 import sqlite3
 import os
 import hashlib
+import threading
 from datetime import datetime
 from pathlib import Path
 
+# Applied once per connection. WAL lets reads run alongside a write, and
+# synchronous=NORMAL is still crash-safe in WAL mode (only a power loss can
+# drop the last commits); page cache and mmap are sized for the whole file
+_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536'
+)
+
+# Cached forensic results older than this (in seconds) are ignored and pruned
+ANALYSIS_CACHE_TTL = 7 * 24 * 3600
+
+
 class ForensicDatabase:
     """
     SQLite database to track NOA identification numbers and detect duplicates
+    One connection is kept open per instance and shared between threads
+    (Streamlit runs sessions on separate threads); a lock serializes access
     """
     
     def __init__(self, db_path='forensic_records.db'):
         """Initialize database connection"""
         self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # Rows index by position (as tuples did) and by column name
+        self._conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            self._conn.execute(pragma)
         self._create_tables()
     
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+    
     def _create_tables(self):
         """Create tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
+        # Runs from __init__ only, before the connection can be shared
+        conn = self._conn
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -56,8 +86,27 @@ class ForensicDatabase:
             ON noa_ids(sin_last_4)
         ''')
         
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_document_hash 
+            ON noa_ids(document_hash)
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_detected_timestamp 
+            ON duplicate_detections(detected_timestamp)
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                document_hash TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                result_json TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (document_hash, variant)
+            )
+        ''')
+        
         conn.commit()
-        conn.close()
     
     def check_duplicate_id(self, identification_number):
         """
@@ -69,29 +118,36 @@ class ForensicDatabase:
                 'original_record': dict or None
             }
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM noa_ids 
-            WHERE identification_number = ?
-        ''', (identification_number,))
+        return self._find_record('identification_number', identification_number)
+    
+    def check_duplicate_hash(self, document_hash):
+        """
+        Check if a byte-identical document was already stored
         
-        result = cursor.fetchone()
-        conn.close()
+        Returns:
+            dict with {
+                'is_duplicate': bool,
+                'original_record': dict or None
+            }
+        """
+        return self._find_record('document_hash', document_hash)
+    
+    def _find_record(self, column, value):
+        """Look up the first noa_ids row where column equals value"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute(f'''
+                SELECT id, identification_number, sin_last_4, full_name,
+                       date_issued, uploaded_timestamp, file_name
+                FROM noa_ids
+                WHERE {column} = ?
+            ''', (value,))
+            result = cursor.fetchone()
         
         if result:
             return {
                 'is_duplicate': True,
-                'original_record': {
-                    'id': result[0],
-                    'identification_number': result[1],
-                    'sin_last_4': result[2],
-                    'full_name': result[3],
-                    'date_issued': result[4],
-                    'uploaded_timestamp': result[5],
-                    'file_name': result[7]
-                }
+                'original_record': dict(result)
             }
         else:
             return {
@@ -107,20 +163,16 @@ class ForensicDatabase:
         Returns:
             bool: True if stored, False if duplicate
         """
-        # Check if already exists
-        check_result = self.check_duplicate_id(identification_number)
-        if check_result['is_duplicate']:
-            return False
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT INTO noa_ids 
-                (identification_number, sin_last_4, full_name, date_issued, 
+        # A single statement: an existing ID makes the insert a no-op that
+        # changes no row. Only the identification_number conflict is ignored
+        # (unlike INSERT OR IGNORE), so other constraint errors still raise
+        with self._lock:
+            cursor = self._conn.execute('''
+                INSERT INTO noa_ids
+                (identification_number, sin_last_4, full_name, date_issued,
                  uploaded_timestamp, document_hash, file_name)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(identification_number) DO NOTHING
             ''', (
                 identification_number,
                 sin_last_4,
@@ -131,66 +183,112 @@ class ForensicDatabase:
                 file_name
             ))
             
-            conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-        finally:
-            conn.close()
+            self._conn.commit()
+            return cursor.rowcount == 1
     
     def record_duplicate_detection(self, identification_number, duplicate_file_name):
         """Record when a duplicate ID is detected"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get original record ID
-        cursor.execute('''
-            SELECT id FROM noa_ids WHERE identification_number = ?
-        ''', (identification_number,))
-        
-        original_id = cursor.fetchone()
-        
-        if original_id:
+        with self._lock:
+            cursor = self._conn.cursor()
+            
+            # Get original record ID
             cursor.execute('''
-                INSERT INTO duplicate_detections
-                (identification_number, original_record_id, duplicate_file_name, detected_timestamp)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                identification_number,
-                original_id[0],
-                duplicate_file_name,
-                datetime.now().isoformat()
-            ))
+                SELECT id FROM noa_ids WHERE identification_number = ?
+            ''', (identification_number,))
             
-            conn.commit()
+            original_id = cursor.fetchone()
+            
+            if original_id:
+                cursor.execute('''
+                    INSERT INTO duplicate_detections
+                    (identification_number, original_record_id, duplicate_file_name, detected_timestamp)
+                    VALUES (?, ?, ?, ?)
+                ''', (
+                    identification_number,
+                    original_id[0],
+                    duplicate_file_name,
+                    datetime.now().isoformat()
+                ))
+                
+                self._conn.commit()
+    
+    def get_cached_analysis(self, document_hash, variant, ttl=ANALYSIS_CACHE_TTL):
+        """
+        Get stored forensic results for a document
+        
+        Args:
+            document_hash: content_hash() of the document
+            variant: What the results depend on besides the content
+                (document type, analyzer version)
+            ttl: Maximum age of the stored results in seconds
         
-        conn.close()
+        Returns:
+            str: JSON stored by store_analysis, or None if not cached
+        """
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT result_json FROM analysis_cache
+                WHERE document_hash = ? AND variant = ?
+                  AND created_at >= datetime('now', ?)
+            ''', (document_hash, variant, f'-{int(ttl)} seconds')).fetchone()
+        
+        return row[0] if row else None
+    
+    def store_analysis(self, document_hash, variant, result_json, ttl=ANALYSIS_CACHE_TTL):
+        """Store (or replace) the JSON forensic results for a document and drop expired entries"""
+        with self._lock:
+            self._conn.execute('''
+                DELETE FROM analysis_cache WHERE created_at < datetime('now', ?)
+            ''', (f'-{int(ttl)} seconds',))
+            self._conn.execute('''
+                INSERT OR REPLACE INTO analysis_cache (document_hash, variant, result_json)
+                VALUES (?, ?, ?)
+            ''', (document_hash, variant, result_json))
+            self._conn.commit()
     
     def get_all_records(self):
         """Get all stored identification numbers"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM noa_ids ORDER BY created_at DESC')
-        results = cursor.fetchall()
-        conn.close()
-        
-        return results
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('SELECT * FROM noa_ids ORDER BY created_at DESC')
+            return cursor.fetchall()
     
-    def get_duplicate_history(self):
-        """Get all duplicate detection records"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT d.*, n.full_name, n.sin_last_4
-            FROM duplicate_detections d
-            LEFT JOIN noa_ids n ON d.original_record_id = n.id
-            ORDER BY d.detected_timestamp DESC
-        ''')
+    def get_duplicate_history(self, limit=None):
+        """
+        Get duplicate detection records, newest first
         
-        results = cursor.fetchall()
-        conn.close()
+        Args:
+            limit: Maximum number of records (None for all)
         
-        return results
+        Returns:
+            list of rows with id, identification_number, duplicate_file_name,
+            detected_timestamp, full_name and sin_last_4
+        """
+        # Newest-first walk of idx_detected_timestamp; LIMIT -1 means no limit
+        with self._lock:
+            return self._conn.execute('''
+                SELECT d.id, d.identification_number, d.duplicate_file_name,
+                       d.detected_timestamp, n.full_name, n.sin_last_4
+                FROM duplicate_detections d
+                LEFT JOIN noa_ids n ON d.original_record_id = n.id
+                ORDER BY d.detected_timestamp DESC
+                LIMIT ?
+            ''', (-1 if limit is None else limit,)).fetchall()
+
+
+_shared_databases = {}
+_shared_databases_lock = threading.Lock()
 
+
+def get_database(db_path='forensic_records.db'):
+    """
+    Shared ForensicDatabase for db_path, opened on first use
+    The instance is kept open for the life of the process and already
+    serializes access between threads, so every caller uses the same
+    connection instead of opening (and leaking) one per operation
+    """
+    with _shared_databases_lock:
+        db = _shared_databases.get(db_path)
+        if db is None:
+            db = _shared_databases[db_path] = ForensicDatabase(db_path)
+        return db
@@ -1,15 +1,18 @@
 from .checks import (
-    check_text_alignment,
-    check_font_consistency,
     check_metadata,
-    check_number_patterns,
     check_image_quality,
     check_page_numbers,
-    extract_and_check_noa_id
+    extract_and_check_noa_id,
+    run_text_checks,
+    DocumentContext,
+    content_hash,
+    IMAGE_CHECK_DPI
 )
+from .database import get_database
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 import io
-import tempfile
+import json
 import os
 
 
@@ -22,7 +25,8 @@ def preprocess_uploaded_file(uploaded_file):
         uploaded_file: Streamlit uploaded file object
     
     Returns:
-        tuple: (pdf_bytes, file_type, temp_path)
+        tuple: (pdf_bytes, file_type, temp_path); temp_path is always None
+        now that images are converted in memory, and is kept for callers
     """
     file_bytes = uploaded_file.getvalue()
     file_name = uploaded_file.name.lower()
@@ -36,13 +40,15 @@ def preprocess_uploaded_file(uploaded_file):
         try:
             from reportlab.pdfgen import canvas
             from reportlab.lib.pagesizes import letter
+            from reportlab.lib.utils import ImageReader
             
             # Open image
             img = Image.open(io.BytesIO(file_bytes))
             
-            # Create PDF in memory
+            # Create PDF in memory; invariant output (no creation date or
+            # random document ID) so the same image always gives the same PDF
             pdf_buffer = io.BytesIO()
-            c = canvas.Canvas(pdf_buffer, pagesize=letter)
+            c = canvas.Canvas(pdf_buffer, pagesize=letter, invariant=1)
             
             # Get page dimensions
             page_width, page_height = letter
@@ -64,18 +70,14 @@ def preprocess_uploaded_file(uploaded_file):
             x = (page_width - display_width) / 2
             y = (page_height - display_height) / 2
             
-            # Save image temporarily
-            temp_img_path = tempfile.NamedTemporaryFile(delete=False, suffix='.png').name
-            img.save(temp_img_path, 'PNG')
-            
-            # Draw image on PDF
-            c.drawImage(temp_img_path, x, y, width=display_width, height=display_height)
+            # Draw the decoded image straight from memory (no temp PNG)
+            c.drawImage(ImageReader(img), x, y, width=display_width, height=display_height)
             c.save()
             
             # Get PDF bytes
             pdf_bytes = pdf_buffer.getvalue()
             
-            return pdf_bytes, 'image_converted', temp_img_path
+            return pdf_bytes, 'image_converted', None
             
         except Exception as e:
             raise ValueError(f"Could not convert image to PDF: {str(e)}")
@@ -84,19 +86,125 @@ def preprocess_uploaded_file(uploaded_file):
         raise ValueError(f"Unsupported file format: {file_name}")
 
 
-def analyze_document_forensics(pdf_file, pdf_bytes=None, file_name='unknown', doc_type='unknown'):
+def _rendered_image_quality(doc):
+    """
+    Render the first pages once and run the blur check on them
+    Returns: (page_images or None, check_image_quality result)
+    """
+    try:
+        page_images = doc.page_images(IMAGE_CHECK_DPI, 3)
+    except Exception:
+        # check_image_quality reports the rendering error itself
+        page_images = None
+    return page_images, check_image_quality(doc, max_pages=3, images=page_images)
+
+
+# Result keys of the individual checks that make up the overall score
+CHECK_KEYS = ('alignment', 'fonts', 'metadata', 'numbers', 'image', 'page_numbers', 'noa_id_check')
+
+# In fast mode, a check scoring at least this much skips the remaining ones
+FAST_EXIT_SCORE = 80
+
+
+# Bump when a check changes, so results cached by older code are not reused
+ANALYSIS_CACHE_VERSION = 2
+
+
+def _saturated(results):
+    """True once any finished check has reached FAST_EXIT_SCORE"""
+    return any(
+        ((results[key] or {}).get('risk_score') or 0) >= FAST_EXIT_SCORE
+        for key in CHECK_KEYS
+    )
+
+
+def _should_run(results, key, fast):
+    """A check runs unless its result is cached or fast mode has stopped"""
+    return results[key] is None and not (fast and _saturated(results))
+
+
+def run_noa_id_check(pdf_source, file_name='unknown', doc_type='unknown', first_page_text=None, doc_hash=None):
+    """
+    NOA ID duplicate check, with the error handling of the full analysis
+    The check records new IDs in the forensic database, so its result must
+    never be cached: callers that cache analyze_document_forensics results
+    pass include_noa_id=False and run this once per upload instead
+    
+    Args:
+        pdf_source: File path, PDF bytes or DocumentContext
+        file_name: Original file name for tracking
+        doc_type: Document type ('noa', 't1', or 'unknown')
+        first_page_text: Page 1 text if already extracted
+        doc_hash: Optional precomputed content_hash() of the document
+    
+    Returns:
+        dict: the 'noa_id_check' result
+    """
+    try:
+        return extract_and_check_noa_id(pdf_source, file_name, doc_type, first_page_text, doc_hash)
+    except Exception as e:
+        return {'risk_score': 0, 'error': str(e), 'applicable': False}
+
+
+def score_results(results):
+    """
+    Set overall_score and risk_level from the individual checks
+    Checks that did not run are marked {'risk_score': None, 'skipped': True}
+    and left out of the overall score
+    
+    Returns:
+        The same results dict
+    """
+    for key in CHECK_KEYS:
+        if results[key] is None:
+            results[key] = {'risk_score': None, 'skipped': True}
+    
+    # Calculate overall score including new checks (skipped ones excluded)
+    scores = [
+        results[key].get('risk_score', 0)
+        for key in CHECK_KEYS
+        if not results[key].get('skipped')
+    ]
+    
+    results['overall_score'] = sum(scores) / len(scores)
+    
+    # Risk level calculation
+    if results['overall_score'] < 30:
+        results['risk_level'] = 'LOW'
+    elif results['overall_score'] < 60:
+        results['risk_level'] = 'MEDIUM'
+    else:
+        results['risk_level'] = 'HIGH'
+    
+    return results
+
+
+def analyze_document_forensics(pdf_file, pdf_bytes=None, file_name='unknown', doc_type='unknown', doc_hash=None,
+                               fast=False, use_cache=True, include_noa_id=True):
     """
     Complete forensic analysis of a PDF document with new NOA-specific checks
     Now supports JPEG/PNG via conversion
     
     Args:
         pdf_file: File path or uploaded file object
-        pdf_bytes: Optional bytes for image analysis
+        pdf_bytes: Optional bytes for image analysis; when omitted, an
+            uploaded file is read once with getvalue() and a path is read
+            directly by the raster/OCR checks
         file_name: Original file name for tracking
         doc_type: Document type ('noa', 't1', or 'unknown')
+        doc_hash: Optional precomputed content_hash() of the document
+        fast: Stop once any check scores FAST_EXIT_SCORE or more; the checks
+            not run are marked {'risk_score': None, 'skipped': True} and left
+            out of the overall score (a skipped NOA ID is not recorded)
+        use_cache: Reuse results stored in the forensic database for the same
+            content and doc_type. The NOA ID check always re-runs, since a
+            re-upload is exactly what it detects. Fast-mode runs are not cached
+        include_noa_id: Run the NOA ID duplicate check. When False it is
+            marked skipped, for callers that run run_noa_id_check themselves
         
     Returns:
-        dict with all forensic results and overall score
+        dict with all forensic results and overall score; '_page_images' holds
+        the first rendered pages for reuse by create_forensic_visualizations
     """
     
     results = {
@@ -108,76 +216,110 @@ def analyze_document_forensics(pdf_file, pdf_bytes=None, file_name='unknown', do
         'page_numbers': None,      # NEW
         'noa_id_check': None,      # NEW
         'overall_score': 0,
-        'risk_level': 'LOW'
+        'risk_level': 'LOW',
+        '_page_images': None
     }
     
-    # Run existing checks
-    try:
-        results['alignment'] = check_text_alignment(pdf_file)
-    except Exception as e:
-        results['alignment'] = {'risk_score': 0, 'error': str(e)}
-    
-    try:
-        results['fonts'] = check_font_consistency(pdf_file)
-    except Exception as e:
-        results['fonts'] = {'risk_score': 0, 'error': str(e)}
-    
-    try:
-        results['metadata'] = check_metadata(pdf_file)
-    except Exception as e:
-        results['metadata'] = {'risk_score': 0, 'error': str(e)}
-    
-    try:
-        results['numbers'] = check_number_patterns(pdf_file)
-    except Exception as e:
-        results['numbers'] = {'risk_score': 0, 'error': str(e)}
-    
-    try:
-        if pdf_bytes:
-            results['image'] = check_image_quality(pdf_bytes)
-        else:
-            results['image'] = {'risk_score': 0, 'flags': ['Image analysis skipped']}
-    except Exception as e:
-        results['image'] = {'risk_score': 0, 'error': str(e)}
-    
-    # NEW CHECK 1: Page number consistency (NOA only)
-    try:
-        if pdf_bytes:
-            results['page_numbers'] = check_page_numbers(pdf_bytes, doc_type)
-        else:
-            results['page_numbers'] = {'risk_score': 0, 'applicable': False}
-    except Exception as e:
-        results['page_numbers'] = {'risk_score': 0, 'error': str(e), 'applicable': False}
+    # An uploaded file is materialized once; every check then shares the
+    # same bytes instead of reading (and seeking) the buffer itself
+    if pdf_bytes is None and hasattr(pdf_file, 'getvalue'):
+        pdf_bytes = pdf_file.getvalue()
     
-    # NEW CHECK 2: NOA ID duplicate detection (NOA only)
-    try:
-        if pdf_bytes:
-            results['noa_id_check'] = extract_and_check_noa_id(pdf_bytes, file_name, doc_type)
-        else:
-            results['noa_id_check'] = {'risk_score': 0, 'applicable': False}
-    except Exception as e:
-        results['noa_id_check'] = {'risk_score': 0, 'error': str(e), 'applicable': False}
+    # One shared document for every check. The file on disk is preferred
+    # (poppler and the parse pool read it directly); the raster/OCR checks
+    # need either a path or explicit bytes
+    has_raster_source = isinstance(pdf_file, str) or bool(pdf_bytes)
+    doc_source = pdf_file if isinstance(pdf_file, str) else pdf_bytes or pdf_file
     
-    # Calculate overall score including new checks
-    scores = [
-        results['alignment'].get('risk_score', 0),
-        results['fonts'].get('risk_score', 0),
-        results['metadata'].get('risk_score', 0),
-        results['numbers'].get('risk_score', 0),
-        results['image'].get('risk_score', 0),
-        results['page_numbers'].get('risk_score', 0),       # NEW
-        results['noa_id_check'].get('risk_score', 0)        # NEW
-    ]
+    cache_db = None
+    cache_variant = f'{doc_type.lower()}/v{ANALYSIS_CACHE_VERSION}'
+    cached = False
+    if use_cache and not fast and isinstance(doc_source, (str, bytes, bytearray, memoryview)):
+        try:
+            if doc_hash is None:
+                doc_hash = content_hash(doc_source)
+            cache_db = get_database()
+            cached_json = cache_db.get_cached_analysis(doc_hash, cache_variant)
+            if cached_json is not None:
+                results.update(json.loads(cached_json))
+                cached = True
+        except Exception:
+            # The cache is an optimization only; analyze from scratch
+            cache_db = None
     
-    results['overall_score'] = sum(scores) / len(scores)
+    with DocumentContext(doc_source) as doc, ThreadPoolExecutor(max_workers=1) as executor:
+        # Rasterize (poppler) and run the blur check in the background while
+        # the checks below parse the PDF. pdfium is not thread-safe, so the
+        # page count is read here and every pdfium call stays on this thread.
+        # fast mode runs it in order instead, so it can be skipped
+        image_future = None
+        if has_raster_source and not fast and results['image'] is None:
+            try:
+                doc.page_count
+                image_future = executor.submit(_rendered_image_quality, doc)
+            except Exception:
+                # Unreadable by pdfium; rendered inline below, which reports it
+                image_future = None
+        
+        # Checks run cheapest first: metadata, the shared text parse, the blur
+        # check, then the two OCR checks
+        if _should_run(results, 'metadata', fast):
+            try:
+                results['metadata'] = check_metadata(doc)
+            except Exception as e:
+                results['metadata'] = {'risk_score': 0, 'error': str(e)}
+        
+        # Parse the PDF once and share the page data across the text-based checks
+        pages = None
+        if _should_run(results, 'alignment', fast):
+            text_results = run_text_checks(doc)
+            pages = text_results['pages']
+            results['alignment'] = text_results['alignment']
+            results['fonts'] = text_results['fonts']
+            results['numbers'] = text_results['numbers']
+        
+        # Rendered once; the blur check and the visualizer share these pages
+        if _should_run(results, 'image', fast):
+            try:
+                if image_future is not None:
+                    results['_page_images'], results['image'] = image_future.result()
+                elif has_raster_source:
+                    results['_page_images'], results['image'] = _rendered_image_quality(doc)
+                else:
+                    results['image'] = {'risk_score': 0, 'flags': ['Image analysis skipped']}
+            except Exception as e:
+                results['image'] = {'risk_score': 0, 'error': str(e)}
+        
+        # NEW CHECK 1: Page number consistency (NOA only)
+        if _should_run(results, 'page_numbers', fast):
+            try:
+                if has_raster_source:
+                    results['page_numbers'] = check_page_numbers(doc, doc_type)
+                else:
+                    results['page_numbers'] = {'risk_score': 0, 'applicable': False}
+            except Exception as e:
+                results['page_numbers'] = {'risk_score': 0, 'error': str(e), 'applicable': False}
+        
+        # NEW CHECK 2: NOA ID duplicate detection (NOA only)
+        if include_noa_id and _should_run(results, 'noa_id_check', fast):
+            if has_raster_source:
+                first_page_text = (pages[0]['text'] or '') if pages else None
+                results['noa_id_check'] = run_noa_id_check(doc, file_name, doc_type, first_page_text, doc_hash)
+            else:
+                results['noa_id_check'] = {'risk_score': 0, 'applicable': False}
     
-    # Risk level calculation
-    if results['overall_score'] < 30:
-        results['risk_level'] = 'LOW'
-    elif results['overall_score'] < 60:
-        results['risk_level'] = 'MEDIUM'
-    else:
-        results['risk_level'] = 'HIGH'
+    # Store everything but the NOA ID result (and the page images). Results
+    # with a failed check are not stored: the failure may be transient or a
+    # missing dependency (Tesseract, poppler) that is installed later
+    stored = {key: results[key] for key in CHECK_KEYS if key != 'noa_id_check'}
+    if cache_db is not None and not cached and not any(
+        'error' in (result or {}) for result in stored.values()
+    ):
+        try:
+            cache_db.store_analysis(doc_hash, cache_variant, json.dumps(stored, default=str))
+        except Exception:
+            pass
     
-    return results
+    # Checks skipped by fast mode (or include_noa_id=False) carry no score
+    return score_results(results)
 
@@ -1,115 +1,121 @@
 import streamlit as st
 import pdfplumber
-from pdf2image import convert_from_bytes
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
+from PIL import ImageColor, ImageDraw
 import numpy as np
 from collections import Counter
 
-def create_forensic_visualizations(pdf_file, pdf_bytes, forensic_results, max_pages=2):
+from .checks import render_pdf_pages, IMAGE_CHECK_DPI
+
+
+def _boxes(items):
+    """(N, 4) array of the x0/top/x1/bottom boxes of chars or words"""
+    return np.array(
+        [(item['x0'], item['top'], item['x1'], item['bottom']) for item in items],
+        dtype=np.float64
+    ).reshape(-1, 4)
+
+
+def _draw_boxes(img, boxes, scale, color, alpha, width=1, edgecolor=None):
+    """
+    Return an RGB copy of img with boxes from _boxes() filled and outlined
+    Drawn with PIL straight onto the page raster (no figure, axes or
+    resampling); alpha applies to both fill and outline
+    """
+    overlay = img.convert('RGB')
+    draw = ImageDraw.Draw(overlay, 'RGBA')
+    fill = ImageColor.getrgb(color) + (round(alpha * 255),)
+    outline = ImageColor.getrgb(edgecolor or color) + (round(alpha * 255),)
+    for x0, top, x1, bottom in boxes * scale:
+        draw.rectangle((x0, top, x1, bottom), fill=fill, outline=outline, width=width)
+    return overlay
+
+
+def create_forensic_visualizations(pdf_file, pdf_bytes, forensic_results, max_pages=2, page_images=None):
     """
     Generate annotated images showing forensic issues
     
     Args:
         pdf_file: File path
-        pdf_bytes: PDF bytes for image conversion
+        pdf_bytes: PDF bytes for image conversion (None renders from pdf_file)
         forensic_results: Results from forensic_analyzer
         max_pages: Number of pages to visualize
+        page_images: Pages already rendered by the analyzer; skips rasterizing.
+            Otherwise pages are rendered at the same DPI the analyzer uses,
+            which is about the width of one column of the 2x2 grid
     """
     
     st.subheader("📊 Visual Forensic Analysis")
     
-    try:
-        images = convert_from_bytes(pdf_bytes, dpi=200)
-    except Exception as e:
-        st.error(f"Could not generate visualizations: {str(e)}")
-        return
+    if page_images:
+        images = page_images
+    else:
+        try:
+            images = render_pdf_pages(
+                pdf_bytes if pdf_bytes else pdf_file, dpi=IMAGE_CHECK_DPI, grayscale=True,
+                first_page=1, last_page=max_pages
+            )
+        except Exception as e:
+            st.error(f"Could not generate visualizations: {str(e)}")
+            return
     
     with pdfplumber.open(pdf_file) as pdf:
-        for page_num in range(min(max_pages, len(pdf.pages))):
+        for page_num in range(min(max_pages, len(pdf.pages), len(images))):
             page = pdf.pages[page_num]
             img = images[page_num]
             
             st.markdown(f"### Page {page_num + 1}")
             
-            # Create 2x2 grid
-            fig, axes = plt.subplots(2, 2, figsize=(16, 20))
-            
             scale = img.size[1] / page.height
             
-            # 1. Original
-            axes[0, 0].imshow(img)
-            axes[0, 0].set_title('Original Document', fontweight='bold', fontsize=12)
-            axes[0, 0].axis('off')
+            # Parsed once per page and shared by every panel
+            chars = page.chars
+            words = page.extract_words()
             
             # 2. Font highlighting
-            axes[0, 1].imshow(img)
             font_data = forensic_results['fonts']
+            font_panel = img
             
             if font_data and font_data.get('dominant_font'):
                 dominant = font_data['dominant_font']
-                
-                for char in page.chars:
-                    if char.get('fontname', '') != dominant:
-                        x0 = char['x0'] * scale
-                        y0 = char['top'] * scale
-                        w = (char['x1'] - char['x0']) * scale
-                        h = (char['bottom'] - char['top']) * scale
-                        rect = Rectangle((x0, y0), w, h,
-                                        linewidth=0.5, edgecolor='red',
-                                        facecolor='red', alpha=0.3)
-                        axes[0, 1].add_patch(rect)
-            
-            axes[0, 1].set_title('Font Inconsistencies (Red)', fontweight='bold', fontsize=12)
-            axes[0, 1].axis('off')
+                fonts = np.array([char.get('fontname', '') for char in chars], dtype=object)
+                font_panel = _draw_boxes(img, _boxes(chars)[fonts != dominant], scale, 'red', 0.3)
             
             # 3. Number patterns
-            axes[1, 0].imshow(img)
-            words = page.extract_words()
-            
+            # Bucket number words by style: two decimals, other decimals, integers
+            number_words = {('green', 0.2): [], ('orange', 0.4): [], ('blue', 0.15): []}
             for word in words:
                 if any(c.isdigit() for c in word['text']):
                     if '.' in word['text']:
                         decimals = len(word['text'].split('.')[-1])
-                        color = 'green' if decimals == 2 else 'orange'
-                        alpha = 0.2 if decimals == 2 else 0.4
+                        style = ('green', 0.2) if decimals == 2 else ('orange', 0.4)
                     else:
-                        color = 'blue'
-                        alpha = 0.15
-                    
-                    x0 = word['x0'] * scale
-                    y0 = word['top'] * scale
-                    w = (word['x1'] - word['x0']) * scale
-                    h = (word['bottom'] - word['top']) * scale
-                    rect = Rectangle((x0, y0), w, h,
-                                    linewidth=1, edgecolor=color,
-                                    facecolor=color, alpha=alpha)
-                    axes[1, 0].add_patch(rect)
+                        style = ('blue', 0.15)
+                    number_words[style].append(word)
             
-            axes[1, 0].set_title('Numbers (Green=2dp, Orange=Other)', fontweight='bold', fontsize=12)
-            axes[1, 0].axis('off')
+            number_panel = img
+            for (color, alpha), styled_words in number_words.items():
+                number_panel = _draw_boxes(number_panel, _boxes(styled_words), scale, color, alpha)
             
             # 4. Alignment issues
-            axes[1, 1].imshow(img)
             alignment_data = forensic_results['alignment']
+            alignment_panel = img
             
             if alignment_data and alignment_data.get('issues'):
-                for issue in alignment_data['issues']:
-                    if issue['page'] == page_num + 1:
-                        for word in issue.get('words', []):
-                            x0 = word['x0'] * scale
-                            y0 = word['top'] * scale
-                            w = (word['x1'] - word['x0']) * scale
-                            h = (word['bottom'] - word['top']) * scale
-                            rect = Rectangle((x0, y0), w, h,
-                                            linewidth=2, edgecolor='red',
-                                            facecolor='yellow', alpha=0.4)
-                            axes[1, 1].add_patch(rect)
-            
-            axes[1, 1].set_title('Alignment Issues (Red/Yellow)', fontweight='bold', fontsize=12)
-            axes[1, 1].axis('off')
+                misaligned = [
+                    word
+                    for issue in alignment_data['issues'] if issue['page'] == page_num + 1
+                    for word in issue.get('words', [])
+                ]
+                alignment_panel = _draw_boxes(img, _boxes(misaligned), scale, 'yellow', 0.4, 2, edgecolor='red')
             
-            plt.tight_layout()
-            st.pyplot(fig)
-            plt.close()
+            # 2x2 grid: 1. original, then the three overlays
+            panels = [
+                (img, 'Original Document'),
+                (font_panel, 'Font Inconsistencies (Red)'),
+                (number_panel, 'Numbers (Green=2dp, Orange=Other)'),
+                (alignment_panel, 'Alignment Issues (Red/Yellow)')
+            ]
+            for row in (panels[:2], panels[2:]):
+                for column, (panel, title) in zip(st.columns(2), row):
+                    column.image(panel, caption=title, use_column_width=True)
 
@@ -0,0 +1,75 @@
+"""
+Streamlit Cache Wrappers
+Memoizes the deterministic PDF and Gemini steps of the analysis pipeline so
+reruns on an unchanged upload are served from memory.
+"""
+
+import hashlib
+from typing import Tuple
+
+import streamlit as st
+
+from tax_validators.data_extractor import extract_text_and_page_count
+from tax_validators.gemini_validator import has_failed_sections, validate_all
+from tax_validators.image_analyzer import BLUR_CHECK_DPI, BLUR_THRESHOLD, analyze_image_quality
+
+
+def _hash_bytes(data: bytes) -> str:
+    """Hash PDF bytes in a single blake2b call instead of Streamlit's default hasher"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+_HASH_FUNCS = {bytes: _hash_bytes}
+
+# Validation results are kept for an hour; failed ones are never kept
+VALIDATION_CACHE_TTL = 3600
+
+
+class _UncachedResult(Exception):
+    """Carries a result out of a cached function without Streamlit storing it"""
+
+    def __init__(self, result):
+        super().__init__("result not cached")
+        self.result = result
+
+
+@st.cache_data(show_spinner=False, hash_funcs=_HASH_FUNCS)
+def cached_read_pdf(pdf_bytes: bytes) -> Tuple[str, int]:
+    """Cached text and page count from a single parse of the raw PDF bytes"""
+    return extract_text_and_page_count(pdf_bytes)
+
+
+# Persisted to disk, since re-uploads after a restart would otherwise
+# re-render every page. The render DPI and blur threshold are part of the
+# key: the scores and verdicts depend on them, and entries on disk outlive
+# changes to either
+@st.cache_data(show_spinner=False, hash_funcs=_HASH_FUNCS, persist="disk")
+def _cached_image_quality(pdf_bytes: bytes, dpi: int, threshold: float) -> dict:
+    """analyze_image_quality keyed on the raw PDF bytes and the blur check settings"""
+    return analyze_image_quality(pdf_bytes)
+
+
+def cached_analyze_image_quality(pdf_bytes: bytes) -> dict:
+    """Cached analyze_image_quality keyed on the raw PDF bytes"""
+    return _cached_image_quality(pdf_bytes, BLUR_CHECK_DPI, BLUR_THRESHOLD)
+
+
+@st.cache_data(show_spinner=False, hash_funcs=_HASH_FUNCS, ttl=VALIDATION_CACHE_TTL)
+def _cached_validate_all(t1_text: str, noa_text: str, _model) -> dict:
+    """validate_all, raising _UncachedResult instead of returning error fallbacks"""
+    result = validate_all(t1_text, noa_text, _model)
+    if has_failed_sections(result):
+        raise _UncachedResult(result)
+    return result
+
+
+def cached_validate_all(t1_text: str, noa_text: str, model) -> dict:
+    """
+    Cached validate_all keyed on both extracted texts (model is not hashed)
+    Results with error fallbacks (e.g. after a Gemini quota or network error)
+    are returned but not cached, so the next run asks Gemini again
+    """
+    try:
+        return _cached_validate_all(t1_text, noa_text, model)
+    except _UncachedResult as uncached:
+        return uncached.result
@@ -1,67 +1,451 @@
 """
 PDF Data Extractor Module
-Extracts text and structured data from Canadian tax documents using pdfplumber.
+Extracts text and structured data from Canadian tax documents using pdfplumber
+(text, tables) and pdfium (page count).
 """
 
 import pdfplumber
+import pypdfium2 as pdfium
 import logging
+import multiprocessing
+import os
 import re
-from typing import Dict, List, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple, Union
 from io import BytesIO
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Shared with forensics.checks: pdfium must never run on two threads at once
+from utils.pdfium_lock import PDFIUM_LOCK
+
 logger = logging.getLogger(__name__)
 
+# Documents with at least this many pages have their text read in a process
+# pool, one contiguous page range per worker
+PARALLEL_TEXT_MIN_PAGES = 16
+PARALLEL_TEXT_MAX_WORKERS = 4
+
+# Long extractions log progress every this many pages
+PROGRESS_LOG_PAGES = 100
+
+# Number of (text, doc_type) field extractions kept in memory
+KEY_FIELDS_CACHE_SIZE = 32
+
+# Field patterns are compiled once at import time; each list is tried in
+# order and the first match wins
+_SIN_RE = re.compile(r'\b\d{3}\s*\d{3}\s*\d{3}\b')
+_YEAR_RE = re.compile(r'(?:20\d{2}|19\d{2})')
+
+_T1_NAME_PATTERNS = [
+    re.compile(r'Name:\s*([A-Za-z\s,.-]+)', re.IGNORECASE),
+    re.compile(r'Last name:\s*([A-Za-z\s,.-]+)', re.IGNORECASE),
+    re.compile(r'First name:\s*([A-Za-z\s,.-]+)', re.IGNORECASE),
+    re.compile(r'Surname:\s*([A-Za-z\s,.-]+)', re.IGNORECASE),
+]
+
+_T1_ADDRESS_PATTERNS = [
+    re.compile(r'Address:\s*([^\n]+(?:\n[^\n]+)*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Street address:\s*([^\n]+(?:\n[^\n]+)*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Residential address:\s*([^\n]+(?:\n[^\n]+)*)', re.IGNORECASE | re.MULTILINE),
+]
+
+_T1_REFUND_PATTERNS = [
+    re.compile(r'Refund:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Amount refunded:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Overpayment:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Line 484:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+# 'Label ... amount' patterns stay on one line. Each is anchored at the line
+# start and commits to the first occurrence of every label on the line: when
+# no amount follows that one, none follows a later one either, so the match
+# is the one an unanchored 'Label.*?' finds, without re-scanning the rest of
+# the line from every later occurrence (quadratic on long lines). A lookahead
+# never backtracks once matched, so '(?=(X))\N' (capture X in a lookahead,
+# then consume it by backreference) commits like the atomic group '(?>X)',
+# which Python only supports from 3.11. The captured value is therefore the
+# pattern's last group
+_T1_INCOME_PATTERNS = [
+    re.compile(r'^(?=(.*?Total income))\1(?=(.*?Line 150))\2.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^(?=(.*?Line 150))\1.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Total income:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_T1_NET_INCOME_PATTERNS = [
+    re.compile(r'^(?=(.*?Net income))\1(?=(.*?Line 236))\2.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^(?=(.*?Line 236))\1.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Net income:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_T1_TAXABLE_PATTERNS = [
+    re.compile(r'^(?=(.*?Taxable income))\1(?=(.*?Line 260))\2.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^(?=(.*?Line 260))\1.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Taxable income:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_T1_FEDERAL_TAX_PATTERNS = [
+    re.compile(r'^(?=(.*?Federal tax))\1(?=(.*?Line 420))\2.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^(?=(.*?Line 420))\1.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Federal tax:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_T1_PROVINCIAL_TAX_PATTERNS = [
+    re.compile(r'^(?=(.*?Provincial tax))\1(?=(.*?Line 428))\2.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^(?=(.*?Line 428))\1.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Provincial tax:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_T1_TOTAL_TAX_PATTERNS = [
+    re.compile(r'^(?=(.*?Total tax))\1(?=(.*?Line 435))\2.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'^(?=(.*?Line 435))\1.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Total tax:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_T1_BALANCE_PATTERNS = [
+    re.compile(r'^(?=(.*?Balance owing))\1.*?\$?([\d,]+\.?\d*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Amount owing:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Balance due:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_T1_FILING_DATE_PATTERNS = [
+    re.compile(r'Filing date:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE),
+    re.compile(r'Date filed:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE),
+    re.compile(r'Filed on:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE),
+]
+
+_T1_ACCOUNTANT_PATTERNS = [
+    re.compile(r'Prepared by:\s*([^\n]+)', re.IGNORECASE),
+    re.compile(r'Accountant:\s*([^\n]+)', re.IGNORECASE),
+    re.compile(r'Tax preparer:\s*([^\n]+)', re.IGNORECASE),
+]
+
+_NOA_NAME_PATTERNS = [
+    re.compile(r'Name:\s*([A-Za-z\s,.-]+)', re.IGNORECASE),
+    re.compile(r'Taxpayer name:\s*([A-Za-z\s,.-]+)', re.IGNORECASE),
+    re.compile(r'Assessed for:\s*([A-Za-z\s,.-]+)', re.IGNORECASE),
+]
+
+_NOA_ADDRESS_PATTERNS = [
+    re.compile(r'Address:\s*([^\n]+(?:\n[^\n]+)*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Mailing address:\s*([^\n]+(?:\n[^\n]+)*)', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'Residential address:\s*([^\n]+(?:\n[^\n]+)*)', re.IGNORECASE | re.MULTILINE),
+]
+
+_NOA_REFUND_PATTERNS = [
+    re.compile(r'Refund:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Amount refunded:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Overpayment:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Refund amount:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_NOA_INCOME_PATTERNS = [
+    re.compile(r'Assessed total income:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Total income assessed:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Income assessed:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_NOA_NET_INCOME_PATTERNS = [
+    re.compile(r'Assessed net income:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Net income assessed:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Net income:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_NOA_TAXABLE_PATTERNS = [
+    re.compile(r'Assessed taxable income:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Taxable income assessed:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Taxable income:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_NOA_FEDERAL_TAX_PATTERNS = [
+    re.compile(r'Assessed federal tax:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Federal tax assessed:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Federal tax:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_NOA_PROVINCIAL_TAX_PATTERNS = [
+    re.compile(r'Assessed provincial tax:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Provincial tax assessed:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Provincial tax:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_NOA_TOTAL_TAX_PATTERNS = [
+    re.compile(r'Assessed total tax:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Total tax assessed:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Total tax:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_NOA_BALANCE_PATTERNS = [
+    re.compile(r'Balance owing:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Amount owing:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+    re.compile(r'Balance due:\s*\$?([\d,]+\.?\d*)', re.IGNORECASE),
+]
+
+_NOA_ASSESSMENT_DATE_PATTERNS = [
+    re.compile(r'Assessment date:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE),
+    re.compile(r'Date of assessment:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE),
+    re.compile(r'Assessed on:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE),
+    re.compile(r'Notice date:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', re.IGNORECASE),
+]
+
+# Every field pattern contains a literal label ('Name:', 'Line 150', ...),
+# the first run of letters in it, and can only match where that occurs
+_LABEL_RE = re.compile(r'[A-Za-z][A-Za-z0-9 :]*')
+
+@lru_cache(maxsize=None)
+def _pattern_label(pattern) -> str:
+    """Case-folded label (first literal) of a compiled field pattern"""
+    return _LABEL_RE.search(pattern.pattern).group().casefold()
+
+def _fold_text(pdf_text: str) -> str:
+    """
+    Case-fold text for label lookups. Dotless i is the one character
+    re.IGNORECASE matches to an ASCII letter that casefold() keeps as is
+    """
+    return pdf_text.casefold().replace('\u0131', 'i')
+
+def _first_match(patterns, pdf_text: str, folded_text: str):
+    """
+    Match of the first pattern in the list that matches pdf_text
+    
+    Most labels are absent from any given document, and each miss would
+    otherwise be a full case-insensitive regex scan; a substring search on
+    the folded text rules those patterns out first. When folding kept the
+    text's length (offsets still line up), the regex then starts at the
+    line of the label's first occurrence, since no match can begin earlier.
+    The result is the same as trying every pattern in order.
+    
+    Args:
+        patterns: Compiled field patterns in priority order
+        pdf_text: Extracted text to search
+        folded_text: _fold_text(pdf_text)
+        
+    Returns:
+        re.Match or None
+    """
+    aligned = len(folded_text) == len(pdf_text)
+    for pattern in patterns:
+        index = folded_text.find(_pattern_label(pattern))
+        if index >= 0:
+            start = pdf_text.rfind('\n', 0, index) + 1 if aligned else 0
+            match = pattern.search(pdf_text, start)
+            if match:
+                return match
+    return None
+
+def _captured(match) -> str:
+    """Value group of a field pattern match (always the pattern's last group)"""
+    return match.group(match.re.groups)
+
+def _text_value(match) -> str:
+    """Captured text, trimmed"""
+    return _captured(match).strip()
+
+def _amount_value(match) -> str:
+    """Captured amount without thousands separators"""
+    return _captured(match).replace(',', '')
+
+def _date_value(match) -> str:
+    """Captured date as written"""
+    return _captured(match)
+
+# (field, patterns in priority order, value of the first match) per document
+# type; the SIN and tax year are read for both types by _extract_fields
+_T1_FIELDS = (
+    ('name', _T1_NAME_PATTERNS, _text_value),
+    ('address', _T1_ADDRESS_PATTERNS, _text_value),
+    ('refund_amount', _T1_REFUND_PATTERNS, _amount_value),
+    ('total_income', _T1_INCOME_PATTERNS, _amount_value),
+    ('net_income', _T1_NET_INCOME_PATTERNS, _amount_value),
+    ('taxable_income', _T1_TAXABLE_PATTERNS, _amount_value),
+    ('federal_tax', _T1_FEDERAL_TAX_PATTERNS, _amount_value),
+    ('provincial_tax', _T1_PROVINCIAL_TAX_PATTERNS, _amount_value),
+    ('total_tax', _T1_TOTAL_TAX_PATTERNS, _amount_value),
+    ('balance_owing', _T1_BALANCE_PATTERNS, _amount_value),
+    ('filing_date', _T1_FILING_DATE_PATTERNS, _date_value),
+    ('accountant_info', _T1_ACCOUNTANT_PATTERNS, _text_value),
+)
+
+_NOA_FIELDS = (
+    ('name', _NOA_NAME_PATTERNS, _text_value),
+    ('address', _NOA_ADDRESS_PATTERNS, _text_value),
+    ('refund_amount', _NOA_REFUND_PATTERNS, _amount_value),
+    ('total_income', _NOA_INCOME_PATTERNS, _amount_value),
+    ('net_income', _NOA_NET_INCOME_PATTERNS, _amount_value),
+    ('taxable_income', _NOA_TAXABLE_PATTERNS, _amount_value),
+    ('federal_tax', _NOA_FEDERAL_TAX_PATTERNS, _amount_value),
+    ('provincial_tax', _NOA_PROVINCIAL_TAX_PATTERNS, _amount_value),
+    ('total_tax', _NOA_TOTAL_TAX_PATTERNS, _amount_value),
+    ('balance_owing', _NOA_BALANCE_PATTERNS, _amount_value),
+    ('assessment_date', _NOA_ASSESSMENT_DATE_PATTERNS, _date_value),
+)
+
+def _extract_fields(pdf_text: str, field_table) -> dict:
+    """
+    Extract the SIN, the tax year and every field of a field table
+    
+    Args:
+        pdf_text: Extracted text from PDF
+        field_table: _T1_FIELDS or _NOA_FIELDS
+        
+    Returns:
+        Dictionary with the fields found (missing ones are left out)
+    """
+    fields = {}
+    
+    # Scanned (image-only) PDFs have no text layer to search
+    if not pdf_text or pdf_text.isspace():
+        return fields
+    
+    sin_match = _SIN_RE.search(pdf_text)
+    if sin_match:
+        fields['sin'] = sin_match.group().replace(' ', '')
+    
+    folded_text = _fold_text(pdf_text)
+    for field, patterns, value in field_table:
+        match = _first_match(patterns, pdf_text, folded_text)
+        if match:
+            fields[field] = value(match)
+    
+    year_match = _YEAR_RE.search(pdf_text)
+    if year_match:
+        fields['tax_year'] = year_match.group()
+    
+    return fields
+
+def _open_pdf(pdf_file):
+    """
+    Open a PDF with pdfplumber from any supported source
+    
+    Args:
+        pdf_file: PDF file path, raw bytes/memoryview, BytesIO object or an
+            already-open pdfplumber PDF (left open for the caller to close)
+        
+    Returns:
+        pdfplumber PDF object (use as a context manager)
+    """
+    if isinstance(pdf_file, pdfplumber.PDF):
+        return nullcontext(pdf_file)
+    if isinstance(pdf_file, (bytes, bytearray, memoryview)):
+        return pdfplumber.open(BytesIO(pdf_file))
+    # pdfplumber seeks the stream itself, so no rewind is needed here
+    return pdfplumber.open(pdf_file)
+
+@contextmanager
+def _open_pdfium(pdf_file):
+    """
+    Open a PDF with pdfium from any supported source
+    
+    Args:
+        pdf_file: PDF file path, raw bytes/memoryview, BytesIO object or an
+            already-open pdfium PdfDocument (left open for the caller to close)
+        
+    Yields:
+        pypdfium2 PdfDocument; PDFIUM_LOCK is held until the block exits
+    """
+    with PDFIUM_LOCK:
+        if isinstance(pdf_file, pdfium.PdfDocument):
+            yield pdf_file
+            return
+        if isinstance(pdf_file, (bytearray, memoryview)):
+            pdf_file = bytes(pdf_file)
+        pdf = pdfium.PdfDocument(pdf_file)
+        try:
+            yield pdf
+        finally:
+            pdf.close()
+
+def _page_range_text(pdf, start: int, stop: int) -> List[str]:
+    """
+    Text of pages start..stop-1 (0-based) of an open pdfplumber PDF
+    Text stays on pdfminer's layout: pdfium's text page drops some space
+    glyphs and places glyph boxes differently, which fuses amounts with the
+    line numbers next to them
+    """
+    return [pdf.pages[page_index].extract_text() for page_index in range(start, stop)]
+
+def _page_range_text_worker(pdf_source, start: int, stop: int) -> List[str]:
+    """Process-pool worker: open the PDF and read one page range"""
+    with _open_pdf(pdf_source) as pdf:
+        return _page_range_text(pdf, start, stop)
+
+def _read_page_texts(pdf, pdf_source) -> List[str]:
+    """
+    Text of every page of pdf, opened from pdf_source
+    Long documents given as a path or bytes are split across a process
+    pool (pdfminer's parsing and layout are CPU-bound pure Python, so
+    threads would not help); anything else is read in this process, as is
+    everything when this process is itself a daemonic pool worker (such as
+    debug.py's multiprocessing.Pool), which may not start child processes
+    """
+    num_pages = len(pdf.pages)
+    workers = min(os.cpu_count() or 1, PARALLEL_TEXT_MAX_WORKERS)
+    if multiprocessing.current_process().daemon:
+        workers = 1
+    if isinstance(pdf_source, (bytearray, memoryview)):
+        pdf_source = bytes(pdf_source)
+    if not isinstance(pdf_source, (str, bytes)) or workers < 2 or num_pages < PARALLEL_TEXT_MIN_PAGES:
+        return _page_range_text(pdf, 0, num_pages)
+    
+    # Contiguous ranges, so bytes are sent (and the PDF opened) once per worker
+    step = -(-num_pages // workers)
+    starts = range(0, num_pages, step)
+    stops = [min(start + step, num_pages) for start in starts]
+    with ProcessPoolExecutor(max_workers=len(starts)) as executor:
+        ranges = executor.map(_page_range_text_worker, repeat(pdf_source), starts, stops)
+        return [text for texts in ranges for text in texts]
+
+def _describe_source(pdf_file) -> str:
+    """Human-readable description of a PDF source for log messages"""
+    if isinstance(pdf_file, str):
+        return f"PDF file: {pdf_file}"
+    if isinstance(pdf_file, (pdfplumber.PDF, pdfium.PdfDocument)):
+        return "open PDF document"
+    return f"PDF {type(pdf_file).__name__} object"
+
 def extract_text_from_pdf(pdf_file) -> str:
     """
     Extract all text from PDF file
     
     Args:
-        pdf_file: PDF file path or BytesIO object
+        pdf_file: PDF file path, raw bytes/memoryview, BytesIO object or open pdfplumber PDF
         
     Returns:
         Concatenated text from all pages
     """
     try:
-        text_content = ""
-        
-        # Handle both file path and BytesIO object
-        if isinstance(pdf_file, str):
-            # File path
-            with pdfplumber.open(pdf_file) as pdf:
-                logger.info(f"Extracting text from PDF file: {pdf_file}")
-                for page_num, page in enumerate(pdf.pages, 1):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += f"\n--- Page {page_num} ---\n"
-                        text_content += page_text
-                    logger.info(f"Processed page {page_num}")
-        else:
-            # BytesIO object from Streamlit
-            pdf_file.seek(0)  # Reset file pointer
-            with pdfplumber.open(pdf_file) as pdf:
-                logger.info("Extracting text from PDF BytesIO object")
-                for page_num, page in enumerate(pdf.pages, 1):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += f"\n--- Page {page_num} ---\n"
-                        text_content += page_text
-                    logger.info(f"Processed page {page_num}")
-        
-        logger.info(f"Successfully extracted {len(text_content)} characters")
-        return text_content
+        with _open_pdf(pdf_file) as pdf:
+            return _extract_text(pdf, pdf_file)
         
     except Exception as e:
-        logger.error(f"Error extracting text from PDF: {str(e)}")
+        logger.error("Error extracting text from PDF: %s", e)
         raise Exception(f"Failed to extract text from PDF: {str(e)}")
 
+def _extract_text(pdf, pdf_file) -> str:
+    """Text of a pdfplumber PDF already opened from pdf_file (see extract_text_from_pdf)"""
+    # Joined once at the end; repeated str += copies the text so far each time
+    parts = []
+    
+    logger.info("Extracting text from %s", _describe_source(pdf_file))
+    page_texts = _read_page_texts(pdf, pdf_file)
+    for page_num, page_text in enumerate(page_texts, 1):
+        if page_text:
+            parts.append(f"\n--- Page {page_num} ---\n")
+            parts.append(page_text)
+        if page_num % PROGRESS_LOG_PAGES == 0:
+            logger.info("Processed page %d/%d", page_num, len(page_texts))
+    
+    text_content = ''.join(parts)
+    logger.info("Successfully extracted %d characters from %d pages", len(text_content), len(page_texts))
+    return text_content
+
 def extract_tables_from_pdf(pdf_file) -> list:
     """
     Extract tables if present
     
     Args:
-        pdf_file: PDF file path or BytesIO object
+        pdf_file: PDF file path, raw bytes/memoryview, BytesIO object or open pdfplumber PDF
         
     Returns:
         List of table data
@@ -69,42 +453,24 @@ def extract_tables_from_pdf(pdf_file) -> list:
     try:
         tables_data = []
         
-        # Handle both file path and BytesIO object
-        if isinstance(pdf_file, str):
-            # File path
-            with pdfplumber.open(pdf_file) as pdf:
-                logger.info(f"Extracting tables from PDF file: {pdf_file}")
-                for page_num, page in enumerate(pdf.pages, 1):
-                    page_tables = page.extract_tables()
-                    if page_tables:
-                        for table_num, table in enumerate(page_tables, 1):
-                            tables_data.append({
-                                'page': page_num,
-                                'table': table_num,
-                                'data': table
-                            })
-                        logger.info(f"Found {len(page_tables)} tables on page {page_num}")
-        else:
-            # BytesIO object from Streamlit
-            pdf_file.seek(0)  # Reset file pointer
-            with pdfplumber.open(pdf_file) as pdf:
-                logger.info("Extracting tables from PDF BytesIO object")
-                for page_num, page in enumerate(pdf.pages, 1):
-                    page_tables = page.extract_tables()
-                    if page_tables:
-                        for table_num, table in enumerate(page_tables, 1):
-                            tables_data.append({
-                                'page': page_num,
-                                'table': table_num,
-                                'data': table
-                            })
-                        logger.info(f"Found {len(page_tables)} tables on page {page_num}")
+        with _open_pdf(pdf_file) as pdf:
+            logger.info("Extracting tables from %s", _describe_source(pdf_file))
+            for page_num, page in enumerate(pdf.pages, 1):
+                page_tables = page.extract_tables()
+                if page_tables:
+                    for table_num, table in enumerate(page_tables, 1):
+                        tables_data.append({
+                            'page': page_num,
+                            'table': table_num,
+                            'data': table
+                        })
+                    logger.info("Found %d tables on page %d", len(page_tables), page_num)
         
-        logger.info(f"Successfully extracted {len(tables_data)} tables")
+        logger.info("Successfully extracted %d tables", len(tables_data))
         return tables_data
         
     except Exception as e:
-        logger.error(f"Error extracting tables from PDF: {str(e)}")
+        logger.error("Error extracting tables from PDF: %s", e)
         raise Exception(f"Failed to extract tables from PDF: {str(e)}")
 
 def get_page_count(pdf_file) -> int:
@@ -112,44 +478,61 @@ def get_page_count(pdf_file) -> int:
     Get total number of pages
     
     Args:
-        pdf_file: PDF file path or BytesIO object
+        pdf_file: PDF file path, raw bytes/memoryview, BytesIO object or open pdfium PdfDocument
         
     Returns:
         Page count
     """
     try:
-        # Handle both file path and BytesIO object
-        if isinstance(pdf_file, str):
-            # File path
-            with pdfplumber.open(pdf_file) as pdf:
-                page_count = len(pdf.pages)
-                logger.info(f"PDF file {pdf_file} has {page_count} pages")
-                return page_count
-        else:
-            # BytesIO object from Streamlit
-            pdf_file.seek(0)  # Reset file pointer
-            with pdfplumber.open(pdf_file) as pdf:
-                page_count = len(pdf.pages)
-                logger.info(f"PDF BytesIO object has {page_count} pages")
-                return page_count
+        with _open_pdfium(pdf_file) as pdf:
+            page_count = len(pdf)
+            logger.info("%s has %d pages", _describe_source(pdf_file), page_count)
+            return page_count
                 
     except Exception as e:
-        logger.error(f"Error getting page count from PDF: {str(e)}")
+        logger.error("Error getting page count from PDF: %s", e)
         raise Exception(f"Failed to get page count from PDF: {str(e)}")
 
+def extract_text_and_page_count(pdf_file) -> Tuple[str, int]:
+    """
+    Extract all text and the page count from a single open of the PDF
+    
+    Args:
+        pdf_file: PDF file path, raw bytes/memoryview, BytesIO object or open pdfplumber PDF
+        
+    Returns:
+        (text as returned by extract_text_from_pdf, page count)
+    """
+    try:
+        with _open_pdf(pdf_file) as pdf:
+            return _extract_text(pdf, pdf_file), len(pdf.pages)
+        
+    except Exception as e:
+        logger.error("Error extracting text from PDF: %s", e)
+        raise Exception(f"Failed to extract text from PDF: {str(e)}")
+
 def extract_key_fields(pdf_text: str, doc_type: str) -> dict:
     """
     Extract specific fields based on document type
+    Results are memoized by text content and document type, so re-validating
+    the same document skips the regex suite
     
     Args:
         pdf_text: Extracted text from PDF
         doc_type: Document type ('T1' or 'NOA')
         
     Returns:
-        Dictionary with extracted fields
+        Dictionary with extracted fields (a copy the caller may modify)
     """
+    return dict(_extract_key_fields_cached(pdf_text, doc_type))
+
+# lru_cache keys on the text itself (hashed once per string object, compared
+# on a hit), so no separate digest is needed; failures are not cached
+@lru_cache(maxsize=KEY_FIELDS_CACHE_SIZE)
+def _extract_key_fields_cached(pdf_text: str, doc_type: str) -> dict:
+    """extract_key_fields without the defensive copy"""
     try:
-        logger.info(f"Extracting key fields for document type: {doc_type}")
+        logger.info("Extracting key fields for document type: %s", doc_type)
         
         extracted_fields = {
             'sin': None,
@@ -170,20 +553,21 @@ def extract_key_fields(pdf_text: str, doc_type: str) -> dict:
         }
         
         if doc_type.upper() == 'T1':
-            extracted_fields.update(_extract_t1_fields(pdf_text))
+            found_fields = _extract_t1_fields(pdf_text)
         elif doc_type.upper() == 'NOA':
-            extracted_fields.update(_extract_noa_fields(pdf_text))
+            found_fields = _extract_noa_fields(pdf_text)
         else:
-            logger.warning(f"Unknown document type: {doc_type}")
+            logger.warning("Unknown document type: %s", doc_type)
+            found_fields = {}
+        extracted_fields.update(found_fields)
         
-        # Count successfully extracted fields
-        extracted_count = sum(1 for value in extracted_fields.values() if value is not None)
-        logger.info(f"Successfully extracted {extracted_count} fields")
+        # The extractors only return fields they found
+        logger.info("Successfully extracted %d fields", len(found_fields))
         
         return extracted_fields
         
     except Exception as e:
-        logger.error(f"Error extracting key fields: {str(e)}")
+        logger.error("Error extracting key fields: %s", e)
         raise Exception(f"Failed to extract key fields: {str(e)}")
 
 def _extract_t1_fields(pdf_text: str) -> dict:
@@ -196,167 +580,7 @@ def _extract_t1_fields(pdf_text: str) -> dict:
     Returns:
         Dictionary with T1-specific fields
     """
-    fields = {}
-    
-    # Extract SIN (Social Insurance Number)
-    sin_pattern = r'\b\d{3}\s*\d{3}\s*\d{3}\b'
-    sin_match = re.search(sin_pattern, pdf_text)
-    if sin_match:
-        fields['sin'] = sin_match.group().replace(' ', '')
-    
-    # Extract name (look for common name patterns)
-    name_patterns = [
-        r'Name:\s*([A-Za-z\s,.-]+)',
-        r'Last name:\s*([A-Za-z\s,.-]+)',
-        r'First name:\s*([A-Za-z\s,.-]+)',
-        r'Surname:\s*([A-Za-z\s,.-]+)'
-    ]
-    for pattern in name_patterns:
-        name_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if name_match:
-            fields['name'] = name_match.group(1).strip()
-            break
-    
-    # Extract address (look for address patterns)
-    address_patterns = [
-        r'Address:\s*([^\n]+(?:\n[^\n]+)*)',
-        r'Street address:\s*([^\n]+(?:\n[^\n]+)*)',
-        r'Residential address:\s*([^\n]+(?:\n[^\n]+)*)'
-    ]
-    for pattern in address_patterns:
-        address_match = re.search(pattern, pdf_text, re.IGNORECASE | re.MULTILINE)
-        if address_match:
-            fields['address'] = address_match.group(1).strip()
-            break
-    
-    # Extract refund amount
-    refund_patterns = [
-        r'Refund:\s*\$?([\d,]+\.?\d*)',
-        r'Amount refunded:\s*\$?([\d,]+\.?\d*)',
-        r'Overpayment:\s*\$?([\d,]+\.?\d*)',
-        r'Line 484:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in refund_patterns:
-        refund_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if refund_match:
-            fields['refund_amount'] = refund_match.group(1).replace(',', '')
-            break
-    
-    # Extract total income
-    income_patterns = [
-        r'Total income.*?Line 150.*?\$?([\d,]+\.?\d*)',
-        r'Line 150.*?\$?([\d,]+\.?\d*)',
-        r'Total income:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in income_patterns:
-        income_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if income_match:
-            fields['total_income'] = income_match.group(1).replace(',', '')
-            break
-    
-    # Extract net income
-    net_income_patterns = [
-        r'Net income.*?Line 236.*?\$?([\d,]+\.?\d*)',
-        r'Line 236.*?\$?([\d,]+\.?\d*)',
-        r'Net income:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in net_income_patterns:
-        net_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if net_match:
-            fields['net_income'] = net_match.group(1).replace(',', '')
-            break
-    
-    # Extract taxable income
-    taxable_patterns = [
-        r'Taxable income.*?Line 260.*?\$?([\d,]+\.?\d*)',
-        r'Line 260.*?\$?([\d,]+\.?\d*)',
-        r'Taxable income:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in taxable_patterns:
-        taxable_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if taxable_match:
-            fields['taxable_income'] = taxable_match.group(1).replace(',', '')
-            break
-    
-    # Extract federal tax
-    federal_tax_patterns = [
-        r'Federal tax.*?Line 420.*?\$?([\d,]+\.?\d*)',
-        r'Line 420.*?\$?([\d,]+\.?\d*)',
-        r'Federal tax:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in federal_tax_patterns:
-        fed_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if fed_match:
-            fields['federal_tax'] = fed_match.group(1).replace(',', '')
-            break
-    
-    # Extract provincial tax
-    provincial_tax_patterns = [
-        r'Provincial tax.*?Line 428.*?\$?([\d,]+\.?\d*)',
-        r'Line 428.*?\$?([\d,]+\.?\d*)',
-        r'Provincial tax:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in provincial_tax_patterns:
-        prov_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if prov_match:
-            fields['provincial_tax'] = prov_match.group(1).replace(',', '')
-            break
-    
-    # Extract total tax
-    total_tax_patterns = [
-        r'Total tax.*?Line 435.*?\$?([\d,]+\.?\d*)',
-        r'Line 435.*?\$?([\d,]+\.?\d*)',
-        r'Total tax:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in total_tax_patterns:
-        total_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if total_match:
-            fields['total_tax'] = total_match.group(1).replace(',', '')
-            break
-    
-    # Extract balance owing
-    balance_patterns = [
-        r'Balance owing.*?\$?([\d,]+\.?\d*)',
-        r'Amount owing:\s*\$?([\d,]+\.?\d*)',
-        r'Balance due:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in balance_patterns:
-        balance_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if balance_match:
-            fields['balance_owing'] = balance_match.group(1).replace(',', '')
-            break
-    
-    # Extract filing date
-    filing_date_patterns = [
-        r'Filing date:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'Date filed:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'Filed on:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-    ]
-    for pattern in filing_date_patterns:
-        filing_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if filing_match:
-            fields['filing_date'] = filing_match.group(1)
-            break
-    
-    # Extract tax year
-    year_pattern = r'(?:20\d{2}|19\d{2})'
-    year_match = re.search(year_pattern, pdf_text)
-    if year_match:
-        fields['tax_year'] = year_match.group()
-    
-    # Extract accountant info
-    accountant_patterns = [
-        r'Prepared by:\s*([^\n]+)',
-        r'Accountant:\s*([^\n]+)',
-        r'Tax preparer:\s*([^\n]+)'
-    ]
-    for pattern in accountant_patterns:
-        accountant_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if accountant_match:
-            fields['accountant_info'] = accountant_match.group(1).strip()
-            break
-    
-    return fields
+    return _extract_fields(pdf_text, _T1_FIELDS)
 
 def _extract_noa_fields(pdf_text: str) -> dict:
     """
@@ -368,152 +592,4 @@ def _extract_noa_fields(pdf_text: str) -> dict:
     Returns:
         Dictionary with NOA-specific fields
     """
-    fields = {}
-    
-    # Extract SIN (last 4 digits for NOA)
-    sin_pattern = r'\b\d{3}\s*\d{3}\s*\d{3}\b'
-    sin_match = re.search(sin_pattern, pdf_text)
-    if sin_match:
-        fields['sin'] = sin_match.group().replace(' ', '')
-    
-    # Extract name (look for common name patterns)
-    name_patterns = [
-        r'Name:\s*([A-Za-z\s,.-]+)',
-        r'Taxpayer name:\s*([A-Za-z\s,.-]+)',
-        r'Assessed for:\s*([A-Za-z\s,.-]+)'
-    ]
-    for pattern in name_patterns:
-        name_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if name_match:
-            fields['name'] = name_match.group(1).strip()
-            break
-    
-    # Extract address (look for address patterns)
-    address_patterns = [
-        r'Address:\s*([^\n]+(?:\n[^\n]+)*)',
-        r'Mailing address:\s*([^\n]+(?:\n[^\n]+)*)',
-        r'Residential address:\s*([^\n]+(?:\n[^\n]+)*)'
-    ]
-    for pattern in address_patterns:
-        address_match = re.search(pattern, pdf_text, re.IGNORECASE | re.MULTILINE)
-        if address_match:
-            fields['address'] = address_match.group(1).strip()
-            break
-    
-    # Extract refund amount
-    refund_patterns = [
-        r'Refund:\s*\$?([\d,]+\.?\d*)',
-        r'Amount refunded:\s*\$?([\d,]+\.?\d*)',
-        r'Overpayment:\s*\$?([\d,]+\.?\d*)',
-        r'Refund amount:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in refund_patterns:
-        refund_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if refund_match:
-            fields['refund_amount'] = refund_match.group(1).replace(',', '')
-            break
-    
-    # Extract assessed total income
-    income_patterns = [
-        r'Assessed total income:\s*\$?([\d,]+\.?\d*)',
-        r'Total income assessed:\s*\$?([\d,]+\.?\d*)',
-        r'Income assessed:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in income_patterns:
-        income_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if income_match:
-            fields['total_income'] = income_match.group(1).replace(',', '')
-            break
-    
-    # Extract assessed net income
-    net_income_patterns = [
-        r'Assessed net income:\s*\$?([\d,]+\.?\d*)',
-        r'Net income assessed:\s*\$?([\d,]+\.?\d*)',
-        r'Net income:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in net_income_patterns:
-        net_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if net_match:
-            fields['net_income'] = net_match.group(1).replace(',', '')
-            break
-    
-    # Extract assessed taxable income
-    taxable_patterns = [
-        r'Assessed taxable income:\s*\$?([\d,]+\.?\d*)',
-        r'Taxable income assessed:\s*\$?([\d,]+\.?\d*)',
-        r'Taxable income:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in taxable_patterns:
-        taxable_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if taxable_match:
-            fields['taxable_income'] = taxable_match.group(1).replace(',', '')
-            break
-    
-    # Extract assessed federal tax
-    federal_tax_patterns = [
-        r'Assessed federal tax:\s*\$?([\d,]+\.?\d*)',
-        r'Federal tax assessed:\s*\$?([\d,]+\.?\d*)',
-        r'Federal tax:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in federal_tax_patterns:
-        fed_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if fed_match:
-            fields['federal_tax'] = fed_match.group(1).replace(',', '')
-            break
-    
-    # Extract assessed provincial tax
-    provincial_tax_patterns = [
-        r'Assessed provincial tax:\s*\$?([\d,]+\.?\d*)',
-        r'Provincial tax assessed:\s*\$?([\d,]+\.?\d*)',
-        r'Provincial tax:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in provincial_tax_patterns:
-        prov_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if prov_match:
-            fields['provincial_tax'] = prov_match.group(1).replace(',', '')
-            break
-    
-    # Extract assessed total tax
-    total_tax_patterns = [
-        r'Assessed total tax:\s*\$?([\d,]+\.?\d*)',
-        r'Total tax assessed:\s*\$?([\d,]+\.?\d*)',
-        r'Total tax:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in total_tax_patterns:
-        total_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if total_match:
-            fields['total_tax'] = total_match.group(1).replace(',', '')
-            break
-    
-    # Extract balance owing
-    balance_patterns = [
-        r'Balance owing:\s*\$?([\d,]+\.?\d*)',
-        r'Amount owing:\s*\$?([\d,]+\.?\d*)',
-        r'Balance due:\s*\$?([\d,]+\.?\d*)'
-    ]
-    for pattern in balance_patterns:
-        balance_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if balance_match:
-            fields['balance_owing'] = balance_match.group(1).replace(',', '')
-            break
-    
-    # Extract assessment date
-    assessment_date_patterns = [
-        r'Assessment date:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'Date of assessment:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'Assessed on:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        r'Notice date:\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-    ]
-    for pattern in assessment_date_patterns:
-        assessment_match = re.search(pattern, pdf_text, re.IGNORECASE)
-        if assessment_match:
-            fields['assessment_date'] = assessment_match.group(1)
-            break
-    
-    # Extract tax year
-    year_pattern = r'(?:20\d{2}|19\d{2})'
-    year_match = re.search(year_pattern, pdf_text)
-    if year_match:
-        fields['tax_year'] = year_match.group()
-    
-    return fields
+    return _extract_fields(pdf_text, _NOA_FIELDS)
@@ -4,19 +4,71 @@ Modular LLM-based validation using Google Gemini API for Canadian tax documents.
 """
 
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import os
 import json
 import logging
+import random
+import threading
 import time
-from typing import Dict, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from . import prompt_cache, semantic_cache
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Part of every cache key; bump when a prompt changes so cached responses
+# to the old wording are no longer reused
+PROMPT_VERSION = "v1"
+
+# Gemini requests allowed per minute, shared by every thread in the process
+GEMINI_RPM = 60
+
+# Longest single backoff between retries, in seconds
+MAX_BACKOFF_SECONDS = 60
+
+# Stop retrying once this many requests in a row were rejected for quota (429)
+MAX_CONSECUTIVE_429 = 10
+
+# Starts the flag that the validation fallbacks return when Gemini failed
+VALIDATION_ERROR_PREFIX = "Validation error: "
+
+class _RateLimiter:
+    """Thread-safe token bucket allowing `rate` requests per `period` seconds"""
+    
+    def __init__(self, rate: int, period: float = 60.0):
+        self.rate = rate
+        self.period = period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.period)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) * self.period / self.rate
+            time.sleep(wait_time)
+
+_rate_limiter = _RateLimiter(GEMINI_RPM)
+
+_stats_lock = threading.Lock()
+_stats = {"consecutive_429": 0}
+
+@lru_cache(maxsize=1)
 def initialize_gemini():
     """
     Initialize Gemini API with key from env
+    The model is created once per process and shared by later calls (a
+    failed initialization is not cached, so it is retried next time)
     
     Returns:
         Configured Gemini model instance
@@ -86,15 +138,19 @@ def extract_structured_data_t1(text: str, model) -> dict:
     """.format(text=text)
     
     try:
-        logger.info("Extracting structured data from T1 document using Gemini")
+        cached = semantic_cache.lookup('t1', text, version=PROMPT_VERSION)
+        if cached is not None:
+            return cached
         
-        # Send to Gemini with retry logic
-        response = _send_gemini_request(model, prompt, max_retries=3)
+        logger.info("Extracting structured data from T1 document using Gemini")
         
-        # Parse JSON response
-        structured_data = _parse_json_response(response)
+        # Send to Gemini with retry logic and parse the JSON response
+        structured_data = _request_json(model, prompt, max_retries=3)
+        if structured_data:
+            semantic_cache.store('t1', text, structured_data, version=PROMPT_VERSION)
         
-        logger.info(f"Successfully extracted {len([k for k, v in structured_data.items() if v is not None])} fields from T1")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Successfully extracted %d fields from T1", sum(v is not None for v in structured_data.values()))
         return structured_data
         
     except Exception as e:
@@ -160,15 +216,19 @@ def extract_structured_data_noa(text: str, model) -> dict:
     """.format(text=text)
     
     try:
-        logger.info("Extracting structured data from NOA document using Gemini")
+        cached = semantic_cache.lookup('noa', text, version=PROMPT_VERSION)
+        if cached is not None:
+            return cached
         
-        # Send to Gemini with retry logic
-        response = _send_gemini_request(model, prompt, max_retries=3)
+        logger.info("Extracting structured data from NOA document using Gemini")
         
-        # Parse JSON response
-        structured_data = _parse_json_response(response)
+        # Send to Gemini with retry logic and parse the JSON response
+        structured_data = _request_json(model, prompt, max_retries=3)
+        if structured_data:
+            semantic_cache.store('noa', text, structured_data, version=PROMPT_VERSION)
         
-        logger.info(f"Successfully extracted {len([k for k, v in structured_data.items() if v is not None])} fields from NOA")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Successfully extracted %d fields from NOA", sum(v is not None for v in structured_data.values()))
         return structured_data
         
     except Exception as e:
@@ -199,10 +259,7 @@ def validate_cross_document(t1_data: dict, noa_data: dict, model) -> dict:
         Validation results dictionary
     """
     prompt = """
-    Compare these two Canadian tax documents and identify discrepancies:
-    
-    T1 Data: {t1_data}
-    NOA Data: {noa_data}
+    Compare the two Canadian tax documents given at the end of this prompt and identify discrepancies.
     
     Check for:
     1. SIN matching (last 4 digits)
@@ -231,18 +288,26 @@ def validate_cross_document(t1_data: dict, noa_data: dict, model) -> dict:
       "overall_risk": "low/medium/high",
       "flagged_items": ["list of concerns"]
     }}
+    
+    T1 Data: {t1_data}
+    NOA Data: {noa_data}
     """.format(t1_data=json.dumps(t1_data), noa_data=json.dumps(noa_data))
     
+    cache_text = _cross_cache_text(t1_data, noa_data)
+    
     try:
-        logger.info("Validating cross-document consistency using Gemini")
+        cached = semantic_cache.lookup('cross', cache_text, version=PROMPT_VERSION)
+        if cached is not None:
+            return cached
         
-        # Send to Gemini with retry logic
-        response = _send_gemini_request(model, prompt, max_retries=3)
+        logger.info("Validating cross-document consistency using Gemini")
         
-        # Parse JSON response
-        validation_results = _parse_json_response(response)
+        # Send to Gemini with retry logic and parse the JSON response
+        validation_results = _request_json(model, prompt, max_retries=3)
+        if validation_results:
+            semantic_cache.store('cross', cache_text, validation_results, version=PROMPT_VERSION)
         
-        logger.info(f"Cross-document validation completed with overall risk: {validation_results.get('overall_risk', 'unknown')}")
+        logger.info("Cross-document validation completed with overall risk: %s", validation_results.get('overall_risk', 'unknown'))
         return validation_results
         
     except Exception as e:
@@ -250,7 +315,7 @@ def validate_cross_document(t1_data: dict, noa_data: dict, model) -> dict:
         return {
             "checks": [],
             "overall_risk": "high",
-            "flagged_items": [f"Validation error: {str(e)}"]
+            "flagged_items": [f"{VALIDATION_ERROR_PREFIX}{str(e)}"]
         }
 
 def validate_accountant_info(accountant_name: str, phone: str, model) -> dict:
@@ -266,9 +331,7 @@ def validate_accountant_info(accountant_name: str, phone: str, model) -> dict:
         Validation results dictionary
     """
     prompt = """
-    Validate this Canadian tax preparer information:
-    Name: {accountant_name}
-    Phone: {phone}
+    Validate the Canadian tax preparer information given at the end of this prompt.
     
     Check:
     1. Name is not empty/null
@@ -282,18 +345,29 @@ def validate_accountant_info(accountant_name: str, phone: str, model) -> dict:
       "phone_formatted": "standardized format",
       "flags": ["list of issues if any"]
     }}
+    
+    Name: {accountant_name}
+    Phone: {phone}
     """.format(accountant_name=accountant_name or "null", phone=phone or "null")
     
+    cache_text = _accountant_cache_text(accountant_name, phone)
+    
     try:
-        logger.info("Validating accountant information using Gemini")
+        cached = semantic_cache.lookup('accountant', cache_text, version=PROMPT_VERSION)
+        if cached is not None:
+            return cached
         
-        # Send to Gemini with retry logic
-        response = _send_gemini_request(model, prompt, max_retries=3)
+        logger.info("Validating accountant information using Gemini")
         
-        # Parse JSON response
-        validation_results = _parse_json_response(response)
+        # Send to Gemini with retry logic and parse the JSON response
+        validation_results = _request_json(model, prompt, max_retries=3)
+        if validation_results:
+            semantic_cache.store('accountant', cache_text, validation_results, version=PROMPT_VERSION)
         
-        logger.info(f"Accountant validation completed - Name valid: {validation_results.get('name_valid')}, Phone valid: {validation_results.get('phone_valid')}")
+        logger.info(
+            "Accountant validation completed - Name valid: %s, Phone valid: %s",
+            validation_results.get('name_valid'), validation_results.get('phone_valid')
+        )
         return validation_results
         
     except Exception as e:
@@ -302,53 +376,327 @@ def validate_accountant_info(accountant_name: str, phone: str, model) -> dict:
             "name_valid": False,
             "phone_valid": False,
             "phone_formatted": None,
-            "flags": [f"Validation error: {str(e)}"]
+            "flags": [f"{VALIDATION_ERROR_PREFIX}{str(e)}"]
         }
 
-def _send_gemini_request(model, prompt: str, max_retries: int = 3) -> str:
+def validate_all(t1_text: str, noa_text: str, model) -> dict:
+    """
+    Extract both documents and run both validations in a single Gemini request
+    
+    Replaces the four sequential round-trips (T1 extract, NOA extract,
+    cross-document and accountant validation) with one call. Any section
+    missing from the combined response falls back to its individual call.
+    
+    Args:
+        t1_text: Extracted text from T1 document
+        noa_text: Extracted text from NOA document
+        model: Initialized Gemini model
+        
+    Returns:
+        Dictionary with t1_data, noa_data, validation_results and accountant_results
+    """
+    combined = {}
+    
+    # Skip the batched call when both extractions are already cached
+    if semantic_cache.lookup('t1', t1_text, version=PROMPT_VERSION) is None or semantic_cache.lookup('noa', noa_text, version=PROMPT_VERSION) is None:
+        prompt = """
+    You are validating a pair of Canadian tax documents: a T1 Income Tax Return and
+    the matching Notice of Assessment (NOA). Both document texts are given at the end
+    of this prompt. Perform all four tasks below and return ONE JSON object.
+    
+    Task 1 - "t1_data": extract from the T1 document the SIN, full name, complete address,
+    refund amount or balance owing, total income, net income, taxable income, tax deducted,
+    tax paid by instalments, name of tax professional (if present), tax professional phone
+    number (digits only, without text like "ext.") and date of filing (signature date).
+    
+    Task 2 - "noa_data": extract from the NOA the SIN (last 4 digits visible, format:
+    XXX XX3 XXX), full name, complete address, refund amount (account summary), total income,
+    net income, taxable income, total income tax deducted, tax paid by instalments and date
+    issued (assessment date).
+    
+    Task 3 - "validation_results": compare the two extractions for SIN matching (last 4 digits),
+    name and address matching (exact or minor variations), refund amount, income figures
+    (total, net, taxable), tax deducted, date logic (filing date before assessment date) and
+    installment payments >= $10,000 (flag for review).
+    
+    Task 4 - "accountant_results": validate the T1 tax preparer: name is not empty/null,
+    phone number is a valid Canadian format (10 digits, various formats accepted), and any
+    obvious red flags.
+    
+    Return ONLY a JSON object with these EXACT keys (use null for missing fields):
+    {{
+      "t1_data": {{
+        "sin": "value or null", "full_name": "value or null", "address": "value or null",
+        "refund_amount": "value or null", "total_income": "value or null",
+        "net_income": "value or null", "taxable_income": "value or null",
+        "tax_deducted": "value or null", "tax_paid_instalments": "value or null",
+        "accountant_name": "value or null", "accountant_phone": "value or null",
+        "filing_date": "value or null"
+      }},
+      "noa_data": {{
+        "sin": "value or null", "full_name": "value or null", "address": "value or null",
+        "refund_amount": "value or null", "total_income": "value or null",
+        "net_income": "value or null", "taxable_income": "value or null",
+        "tax_deducted": "value or null", "tax_paid_instalments": "value or null",
+        "date_issued": "value or null"
+      }},
+      "validation_results": {{
+        "checks": [
+          {{"check": "SIN Match", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}},
+          {{"check": "Name Match", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}},
+          {{"check": "Address Match", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}},
+          {{"check": "Refund Amount Match", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}},
+          {{"check": "Total Income Match", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}},
+          {{"check": "Net Income Match", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}},
+          {{"check": "Taxable Income Match", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}},
+          {{"check": "Tax Deducted Match", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}},
+          {{"check": "Date Logic", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}},
+          {{"check": "High Installment Payment", "status": "pass/fail/warning", "confidence": 0-100, "details": "explanation"}}
+        ],
+        "overall_risk": "low/medium/high",
+        "flagged_items": ["list of concerns"]
+      }},
+      "accountant_results": {{
+        "name_valid": true/false,
+        "phone_valid": true/false,
+        "phone_formatted": "standardized format",
+        "flags": ["list of issues if any"]
+      }}
+    }}
+    
+    Return ONLY the JSON, no other text.
+    
+    T1 document text:
+    {t1_text}
+    
+    NOA document text:
+    {noa_text}
+    """.format(t1_text=t1_text, noa_text=noa_text)
+        
+        try:
+            logger.info("Extracting and validating both documents in a single Gemini request")
+            combined = _request_json(
+                model, prompt, max_retries=3, max_output_tokens=4096,
+                required_keys=('t1_data', 'noa_data', 'validation_results', 'accountant_results')
+            )
+        except Exception as e:
+            logger.error(f"Batched Gemini validation failed, falling back to individual calls: {str(e)}")
+            combined = {}
+        
+        # Seed the per-task caches so the individual entry points reuse these results
+        if combined.get('t1_data'):
+            semantic_cache.store('t1', t1_text, combined['t1_data'], version=PROMPT_VERSION)
+        if combined.get('noa_data'):
+            semantic_cache.store('noa', noa_text, combined['noa_data'], version=PROMPT_VERSION)
+        if combined.get('t1_data') and combined.get('noa_data') and combined.get('validation_results'):
+            semantic_cache.store(
+                'cross',
+                _cross_cache_text(combined['t1_data'], combined['noa_data']),
+                combined['validation_results'],
+                version=PROMPT_VERSION
+            )
+        if combined.get('t1_data') and combined['t1_data'].get('accountant_name') and combined.get('accountant_results'):
+            semantic_cache.store(
+                'accountant',
+                _accountant_cache_text(combined['t1_data']['accountant_name'], combined['t1_data'].get('accountant_phone')),
+                combined['accountant_results'],
+                version=PROMPT_VERSION
+            )
+    
+    # Missing sections fall back to individual (network-bound) requests; the
+    # independent ones run side by side: both extractions, then the
+    # cross-document and accountant validations
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        t1_future = _submit_missing(executor, combined, 't1_data', extract_structured_data_t1, t1_text, model)
+        noa_future = _submit_missing(executor, combined, 'noa_data', extract_structured_data_noa, noa_text, model)
+        t1_data = t1_future.result()
+        noa_data = noa_future.result()
+        
+        validation_future = _submit_missing(
+            executor, combined, 'validation_results', validate_cross_document, t1_data, noa_data, model
+        )
+        accountant_future = None
+        if t1_data.get('accountant_name'):
+            accountant_future = _submit_missing(
+                executor, combined, 'accountant_results', validate_accountant_info,
+                t1_data.get('accountant_name'),
+                t1_data.get('accountant_phone'),
+                model
+            )
+        
+        validation_results = validation_future.result()
+        if accountant_future is not None:
+            accountant_results = accountant_future.result()
+        else:
+            accountant_results = {"flags": ["No accountant information found - FLAGGED"]}
+    
+    return {
+        "t1_data": t1_data,
+        "noa_data": noa_data,
+        "validation_results": validation_results,
+        "accountant_results": accountant_results,
+    }
+
+def has_failed_sections(result: dict) -> bool:
+    """
+    Whether a validate_all result contains an error fallback instead of a
+    Gemini answer: an extraction with no field filled in, or a validation
+    flagged with VALIDATION_ERROR_PREFIX
+    
+    Args:
+        result: Dictionary returned by validate_all
+        
+    Returns:
+        True if any section failed
+    """
+    for key in ('t1_data', 'noa_data'):
+        if not any(value is not None for value in result[key].values()):
+            return True
+    
+    flags = result['validation_results'].get('flagged_items', []) + result['accountant_results'].get('flags', [])
+    return any(isinstance(flag, str) and flag.startswith(VALIDATION_ERROR_PREFIX) for flag in flags)
+
+def _submit_missing(executor, combined: dict, key: str, fn, *args) -> Future:
+    """Future for a section of the batched response, calling fn(*args) on the executor if it is missing"""
+    if combined.get(key):
+        future = Future()
+        future.set_result(combined[key])
+        return future
+    return executor.submit(fn, *args)
+
+def _cross_cache_text(t1_data: dict, noa_data: dict) -> str:
+    """Stable semantic-cache input for a cross-document validation"""
+    return f"{json.dumps(t1_data, sort_keys=True)}\n{json.dumps(noa_data, sort_keys=True)}"
+
+def _accountant_cache_text(accountant_name: str, phone: str) -> str:
+    """Stable semantic-cache input for an accountant validation"""
+    return f"{accountant_name}\n{phone}"
+
+def _request_json(model, prompt: str, max_retries: int = 3, max_output_tokens: int = 2048,
+                  required_keys: Tuple[str, ...] = ()) -> dict:
+    """
+    Send a prompt to Gemini and parse the JSON object in the response
+    Responses are cached on disk by prompt_cache (requests run at temperature
+    0), so an identical request is answered without calling the API. Only a
+    response that parses to a non-empty object with every required key is
+    cached; truncated or malformed output is requested again next time
+    
+    Args:
+        model: Initialized Gemini model
+        prompt: Prompt to send
+        max_retries: Maximum number of retry attempts
+        max_output_tokens: Response length limit
+        required_keys: Keys the parsed object must contain to be cached
+        
+    Returns:
+        Parsed dictionary (empty if the response held no valid JSON)
+    """
+    cache_key = prompt_cache.make_key(PROMPT_VERSION, model.model_name, prompt, max_output_tokens)
+    cached = prompt_cache.get(cache_key)
+    if cached is not None:
+        parsed = _parse_json_response(cached)
+        if _is_complete(parsed, required_keys):
+            logger.info("Prompt cache hit, skipping Gemini request")
+            return parsed
+    
+    response = _send_gemini_request(model, prompt, max_retries, max_output_tokens)
+    parsed = _parse_json_response(response)
+    if _is_complete(parsed, required_keys):
+        prompt_cache.set(cache_key, response)
+    return parsed
+
+def _is_complete(parsed: dict, required_keys: Tuple[str, ...]) -> bool:
+    """Whether a parsed response is a non-empty object holding every required key"""
+    return bool(parsed) and all(key in parsed for key in required_keys)
+
+def _send_gemini_request(model, prompt: str, max_retries: int = 3, max_output_tokens: int = 2048) -> str:
     """
     Send request to Gemini API with retry logic and timeout handling
+    Requests are rate limited to GEMINI_RPM; quota (429) and server errors
+    are retried with jittered exponential backoff, other client errors fail
+    immediately
     
     Args:
         model: Initialized Gemini model
         prompt: Prompt to send
         max_retries: Maximum number of retry attempts
+        max_output_tokens: Response length limit
         
     Returns:
         Response text from Gemini
     """
     for attempt in range(max_retries):
         try:
-            logger.info(f"Sending request to Gemini (attempt {attempt + 1}/{max_retries})")
+            _rate_limiter.acquire()
+            logger.debug("Sending request to Gemini (attempt %d/%d)", attempt + 1, max_retries)
             
             # Generate content with timeout handling
             response = model.generate_content(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0,  # Consistent extraction
-                    max_output_tokens=2048,
+                    max_output_tokens=max_output_tokens,
                 )
             )
             
             if response and response.text:
-                logger.info("Successfully received response from Gemini")
+                logger.debug("Successfully received response from Gemini")
+                with _stats_lock:
+                    _stats["consecutive_429"] = 0
                 return response.text
             else:
                 logger.warning(f"Empty response from Gemini on attempt {attempt + 1}")
                 
+        except google_exceptions.TooManyRequests as e:
+            logger.error(f"Gemini quota exceeded on attempt {attempt + 1}: {str(e)}")
+            with _stats_lock:
+                _stats["consecutive_429"] += 1
+                consecutive_429 = _stats["consecutive_429"]
+            if consecutive_429 > MAX_CONSECUTIVE_429:
+                raise Exception(f"Gemini API quota exhausted ({consecutive_429} rejected requests in a row): {str(e)}")
+            _wait_before_retry(attempt, max_retries, e, _retry_after(e))
+            
+        except google_exceptions.ClientError as e:
+            # Any other 4xx fails the same way on every attempt
+            logger.error(f"Gemini API rejected the request: {str(e)}")
+            raise Exception(f"Gemini API rejected the request: {str(e)}")
+            
         except Exception as e:
             logger.error(f"Gemini API error on attempt {attempt + 1}: {str(e)}")
-            
-            if attempt < max_retries - 1:
-                # Wait before retry (exponential backoff)
-                wait_time = 2 ** attempt
-                logger.info(f"Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-            else:
-                raise Exception(f"Gemini API failed after {max_retries} attempts: {str(e)}")
+            _wait_before_retry(attempt, max_retries, e)
     
     raise Exception("Gemini API failed after all retry attempts")
 
+def _wait_before_retry(attempt: int, max_retries: int, error: Exception, retry_after: Optional[float] = None):
+    """
+    Sleep before the next attempt, or raise if this was the last one
+    
+    The wait is the server's retry delay when given, otherwise exponential
+    backoff scaled by a random factor so that parallel callers do not all
+    retry at the same moment
+    """
+    if attempt >= max_retries - 1:
+        raise Exception(f"Gemini API failed after {max_retries} attempts: {str(error)}")
+    
+    if retry_after is None:
+        retry_after = random.uniform(1, 3) * 2 ** attempt
+    wait_time = min(MAX_BACKOFF_SECONDS, retry_after)
+    logger.info("Waiting %.1f seconds before retry...", wait_time)
+    time.sleep(wait_time)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Retry delay in seconds requested by the server, if any (RetryInfo detail or Retry-After header)"""
+    for detail in getattr(error, 'details', None) or []:
+        if hasattr(detail, 'retry_delay'):
+            return detail.retry_delay.ToTimedelta().total_seconds()
+    
+    response = getattr(error, 'response', None)
+    header = response.headers.get('retry-after') if response is not None and hasattr(response, 'headers') else None
+    try:
+        return float(header) if header else None
+    except ValueError:
+        return None
+
 def _parse_json_response(response_text: str) -> dict:
     """
     Parse JSON response from Gemini with error handling
@@ -367,7 +715,7 @@ def _parse_json_response(response_text: str) -> dict:
         if start_idx != -1 and end_idx != -1:
             json_str = response_text[start_idx:end_idx + 1]
             parsed_data = json.loads(json_str)
-            logger.info("Successfully parsed JSON response from Gemini")
+            logger.debug("Successfully parsed JSON response from Gemini")
             return parsed_data
         else:
             logger.warning("No JSON found in Gemini response")
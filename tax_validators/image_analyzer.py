@@ -7,71 +7,104 @@ import cv2
 import numpy as np
 from pdf2image import convert_from_bytes
 from PIL import Image
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 import logging
+import os
+import tempfile
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def convert_pdf_to_images(pdf_bytes) -> List[Image.Image]:
+# Blur detection only needs stroke edges, so pages are rendered as 8-bit
+# grayscale at a modest DPI instead of full-resolution RGB
+BLUR_CHECK_DPI = 100
+
+# Pages scoring below this Laplacian variance are flagged (heuristic for POC).
+# The variance grows as the DPI drops (the same edges span fewer pixels):
+# the original 100 at 200 dpi corresponds to about 900 at BLUR_CHECK_DPI,
+# calibrated on Gaussian-blurred renders of the sample pages
+BLUR_THRESHOLD = 900
+
+# Pages are scored on up to this many threads (OpenCV releases the GIL)
+BLUR_MAX_WORKERS = 8
+
+# Most pdftoppm processes poppler may split the page range across
+RENDER_MAX_THREADS = 4
+
+def convert_pdf_to_images(pdf_bytes, output_folder: Optional[str] = None) -> List[Any]:
 	"""
-	Convert PDF pages to PIL images
+	Convert PDF pages to grayscale PIL images
 	
 	Args:
-		pdf_bytes: Bytes of the PDF file (e.g., from Streamlit upload)
+		pdf_bytes: Bytes/memoryview of the PDF file, a BytesIO-like object or
+			another file object opened in binary mode
+		output_folder: Write the pages to this folder and return their paths
+			instead of decoded images, so no page has to be held in memory
 	
 	Returns:
-		List of PIL Image objects
+		List of PIL Image objects (mode 'L'), or page file paths in page
+		order when output_folder is given
 	"""
 	try:
-		if hasattr(pdf_bytes, 'read'):
-			# BytesIO-like object
+		if hasattr(pdf_bytes, 'getvalue'):
+			# BytesIO-like object; getvalue() ignores the stream position
+			data = pdf_bytes.getvalue()
+		elif hasattr(pdf_bytes, 'read'):
+			# Other file objects (e.g. an open file) are read from the start
 			pdf_bytes.seek(0)
 			data = pdf_bytes.read()
 		else:
-			# Raw bytes
+			# Raw bytes or memoryview
 			data = pdf_bytes
 		
-		# Convert PDF to images at reasonable DPI for quality analysis
-		images = convert_from_bytes(data, dpi=200)
-		logger.info(f"Converted PDF to {len(images)} image(s)")
+		# Grayscale pages at BLUR_CHECK_DPI are all the blur check needs; on
+		# multi-core hosts poppler renders page ranges in parallel processes
+		images = convert_from_bytes(
+			data, dpi=BLUR_CHECK_DPI, grayscale=True,
+			thread_count=min(os.cpu_count() or 1, RENDER_MAX_THREADS),
+			output_folder=output_folder, paths_only=output_folder is not None
+		)
+		logger.info("Converted PDF to %d image(s)", len(images))
 		return images
 	except Exception as e:
 		logger.error(f"Failed to convert PDF to images: {e}")
 		return []
 
-def _pil_to_cv2(image: Image.Image) -> np.ndarray:
-	"""
-	Convert a PIL Image to an OpenCV BGR image array
-	"""
-	return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
 def calculate_blur_score(image) -> float:
 	"""
 	Calculate Laplacian blur score
 	
 	Args:
-		image: PIL Image or OpenCV image
+		image: PIL Image, or OpenCV BGR/grayscale image
 	
 	Returns:
 		Laplacian variance (lower = more blurry)
 	"""
 	try:
-		# Ensure we have a cv2 image
+		# Grayscale pages are used as-is; colour input is converted first
 		if isinstance(image, Image.Image):
-			cv_img = _pil_to_cv2(image)
+			gray = np.asarray(image if image.mode == 'L' else image.convert('L'))
+		elif image.ndim == 2:
+			gray = image
 		else:
-			cv_img = image
+			gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 		
-		# Convert to grayscale
-		gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-		# Laplacian variance as blur metric
-		blur_score = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+		# Laplacian variance as blur metric. A 16-bit signed Laplacian holds the
+		# full range of the default 3x3 kernel on uint8 input, so the variance is
+		# identical to CV_64F at a quarter of the memory traffic.
+		laplacian = cv2.Laplacian(gray, cv2.CV_16S)
+		_, std_dev = cv2.meanStdDev(laplacian)
+		blur_score = float(std_dev[0, 0]) ** 2
 		return blur_score
 	except Exception as e:
 		logger.error(f"Failed to calculate blur score: {e}")
 		return 0.0
 
+def _page_file_blur_score(path: str) -> float:
+	"""Blur score of a page rendered to disk; the page is decoded only for scoring"""
+	with Image.open(path) as image:
+		return calculate_blur_score(image)
+
 def analyze_image_quality(pdf_bytes) -> Dict[str, Any]:
 	"""
 	Analyze all pages for quality issues (blur only for POC)
@@ -82,24 +115,31 @@ def analyze_image_quality(pdf_bytes) -> Dict[str, Any]:
 	Returns:
 		Dictionary with average blur score, list of blurry pages, and flags
 	"""
-	images = convert_pdf_to_images(pdf_bytes)
 	results = {
 		"avg_blur_score": 0.0,
 		"blurry_pages": [],
 		"quality_flags": []
 	}
 	
-	if not images:
-		results["quality_flags"].append("No pages could be processed from the PDF")
-		return results
+	# Pages are rendered to a temporary folder and decoded one at a time as
+	# they are scored, so memory holds at most one page per worker rather
+	# than the whole document
+	with tempfile.TemporaryDirectory() as output_folder:
+		page_files = convert_pdf_to_images(pdf_bytes, output_folder)
+		
+		if not page_files:
+			results["quality_flags"].append("No pages could be processed from the PDF")
+			return results
+		
+		# Pages are independent; score them in parallel when there are cores to use
+		workers = min(os.cpu_count() or 1, BLUR_MAX_WORKERS, len(page_files))
+		if workers > 1:
+			with ThreadPoolExecutor(max_workers=workers) as executor:
+				blur_scores = list(executor.map(_page_file_blur_score, page_files))
+		else:
+			blur_scores = [_page_file_blur_score(path) for path in page_files]
 	
-	blur_scores: List[float] = []
-	for idx, img in enumerate(images):
-		blur = calculate_blur_score(img)
-		blur_scores.append(blur)
-		# Threshold: <100 is potentially blurry (heuristic for POC)
-		if blur < 100:
-			results["blurry_pages"].append(idx + 1)
+	results["blurry_pages"] = [idx + 1 for idx, blur in enumerate(blur_scores) if blur < BLUR_THRESHOLD]
 	
 	# Calculate average blur score
 	results["avg_blur_score"] = float(np.mean(blur_scores)) if blur_scores else 0.0
@@ -108,7 +148,7 @@ def analyze_image_quality(pdf_bytes) -> Dict[str, Any]:
 		results["quality_flags"].append(f"Blurry pages detected: {results['blurry_pages']}")
 	
 	logger.info(
-		f"Image quality analysis complete. Avg blur: {results['avg_blur_score']:.2f}, "
-		f"Blurry pages: {results['blurry_pages']}"
+		"Image quality analysis complete. Avg blur: %.2f, Blurry pages: %s",
+		results['avg_blur_score'], results['blurry_pages']
 	)
 	return results
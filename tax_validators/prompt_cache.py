@@ -0,0 +1,103 @@
+"""
+Prompt Response Cache
+On-disk cache of raw Gemini response text keyed by a hash of the exact
+request (prompt version, model and prompt). Requests run at temperature 0,
+so a repeated prompt is answered from disk instead of the API.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from .semantic_cache import CACHE_DIR, DEFAULT_TTL
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.path.join(CACHE_DIR, 'prompt_cache.db')
+
+
+def make_key(prompt_version: str, model_name: str, prompt: str, max_output_tokens: int) -> str:
+    """
+    Hash everything that determines a response
+
+    Args:
+        prompt_version: Bumped whenever a prompt changes, so old entries miss
+        model_name: Gemini model the prompt is sent to
+        prompt: Full prompt text
+        max_output_tokens: Response length limit (truncates the response)
+
+    Returns:
+        Hex sha256 digest
+    """
+    request = f"{prompt_version}|{model_name}|{max_output_tokens}|{prompt}"
+    return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the cache database, creating it if needed"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    return conn
+
+
+def get(key: str, ttl: int = DEFAULT_TTL) -> Optional[str]:
+    """
+    Return the cached response text for a request key
+
+    Args:
+        key: make_key() of the request
+        ttl: Maximum age of a cached entry in seconds
+
+    Returns:
+        Response text, or None on a miss
+    """
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute('''
+                SELECT response FROM responses
+                WHERE key = ? AND created_at >= ?
+            ''', (key, time.time() - ttl)).fetchone()
+        finally:
+            conn.close()
+
+        return row[0] if row else None
+
+    except Exception as e:
+        logger.warning(f"Prompt cache lookup failed: {str(e)}")
+        return None
+
+
+def set(key: str, response: str, ttl: int = DEFAULT_TTL) -> None:
+    """
+    Store (or replace) the response text for a request key and drop expired entries
+
+    Args:
+        key: make_key() of the request
+        response: Raw response text from Gemini
+        ttl: Maximum age of a cached entry in seconds
+    """
+    try:
+        conn = _connect()
+        try:
+            conn.execute('DELETE FROM responses WHERE created_at < ?', (time.time() - ttl,))
+            conn.execute('''
+                INSERT OR REPLACE INTO responses (key, response, created_at)
+                VALUES (?, ?, ?)
+            ''', (key, response, time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    except Exception as e:
+        logger.warning(f"Prompt cache store failed: {str(e)}")
@@ -0,0 +1,121 @@
+"""
+Normalized-Text Response Cache
+On-disk cache of parsed Gemini responses keyed by the full input text with
+whitespace collapsed, so re-submitted documents whose extracted text differs
+only in layout or line breaks reuse the previous structured output instead
+of calling the API. Any other change, even one letter of a name or address,
+is a miss: reusing another document's extraction is what the validation
+exists to catch.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache')
+CACHE_PATH = os.path.join(CACHE_DIR, 'semantic_cache.db')
+
+# Default time-to-live for cached responses (7 days)
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def _text_key(text: str, version: str = '') -> str:
+    """
+    Hash the whole text with runs of whitespace collapsed to one space,
+    together with the prompt version it was cached under
+    """
+    normalized = ' '.join(text.split())
+    if version:
+        normalized = f"{version}#{normalized}"
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the cache database, creating it if needed"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH)
+    # Entries from the earlier similarity-matched table may belong to a
+    # different document, so they are discarded rather than migrated
+    conn.execute('DROP TABLE IF EXISTS responses')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS text_responses (
+            kind TEXT NOT NULL,
+            text_key TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (kind, text_key)
+        )
+    ''')
+    return conn
+
+
+def lookup(kind: str, text: str, ttl: int = DEFAULT_TTL, version: str = '') -> Optional[dict]:
+    """
+    Return a cached response for the same input text
+
+    Args:
+        kind: Prompt kind ('t1', 'noa', 'cross' or 'accountant')
+        text: Input text the response was generated from
+        ttl: Maximum age of a cached entry in seconds
+        version: Prompt version; entries stored under another version miss
+
+    Returns:
+        Cached response dict, or None on a miss
+    """
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute('''
+                SELECT response FROM text_responses
+                WHERE kind = ? AND text_key = ? AND created_at >= ?
+            ''', (kind, _text_key(text, version), time.time() - ttl)).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return None
+
+        logger.info(f"Semantic cache hit for {kind}")
+        return json.loads(row[0])
+
+    except Exception as e:
+        logger.warning(f"Semantic cache lookup failed: {str(e)}")
+        return None
+
+
+def store(kind: str, text: str, response: dict, ttl: int = DEFAULT_TTL, version: str = '') -> None:
+    """
+    Store (or replace) a response and drop expired entries
+
+    Args:
+        kind: Prompt kind ('t1', 'noa', 'cross' or 'accountant')
+        text: Input text the response was generated from
+        response: Parsed response to cache
+        ttl: Maximum age of a cached entry in seconds
+        version: Prompt version the response was generated with
+    """
+    try:
+        conn = _connect()
+        try:
+            conn.execute('DELETE FROM text_responses WHERE created_at < ?', (time.time() - ttl,))
+            conn.execute('''
+                INSERT OR REPLACE INTO text_responses (kind, text_key, response, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', (
+                kind,
+                _text_key(text, version),
+                json.dumps(response),
+                time.time()
+            ))
+            conn.commit()
+        finally:
+            conn.close()
+
+    except Exception as e:
+        logger.warning(f"Semantic cache store failed: {str(e)}")
@@ -110,6 +110,7 @@ def test_database():
         print(f"✅ Database contains {len(records)} record(s)")
         
         # Clean up test database
+        db.close()
         if os.path.exists('test_forensic.db'):
             os.unlink('test_forensic.db')
             print("✅ Test database cleaned up")
@@ -0,0 +1,9 @@
+"""
+Process-wide lock for pypdfium2.
+pdfium keeps global state and must not be called from two threads at once,
+even for different documents, so every pdfium call in the app holds this
+lock. Process-pool workers are single-threaded and open pdfium directly.
+"""
+import threading
+
+PDFIUM_LOCK = threading.RLock()